@@ -10,15 +10,28 @@
 # - Nuevo ítem: “Modo de consumo o instrucciones de consumo”
 # - PDF horizontal con portada (v5) y evidencias en página nueva
 
+import time
+_t_rerun = time.perf_counter()   # el rerun se mide desde aquí, importaciones incluidas
+
+import json
+import os
+import sys
+import uuid
 import streamlit as st
-import base64
-from io import BytesIO
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib import colors
-from reportlab.lib.units import mm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image as RLImage
+from evidencias import AlmacenEvidencias, CuotaExcedida, TTL_INACTIVIDAD
+from ingesta import IngestorEvidencias, OK, DUPLICADO
+from informe import Informe, ItemInforme, empaquetar_zip, huella
+from tareas_pdf import GeneradorPDF
+from checklist import archivo_por_defecto, cargar_plan, planes_disponibles
+from estado import EstadoRespuestas, InstantaneaInvalida, desde_instantanea
+from persistencia import AlmacenVerificaciones, CAMPOS_ENCABEZADO, RUTA_DB
+from metricas import REGISTRO, RUTA_METRICAS, medir, memoria_proceso, tamano_aprox
+from registro_invima import RegistroINVIMA, RegistroInvalido, RUTA_DB_INVIMA
+
+# En el primer rerun del proceso es el costo real de importar; luego, solo la búsqueda en sys.modules
+REGISTRO.observar("importaciones", time.perf_counter() - _t_rerun)
 
 # ===========================================
 # CONFIG INICIAL
@@ -26,382 +39,579 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 st.set_page_config(page_title="Checklist Rotulado — Resolución 5109/2005 (v5)", layout="wide")
 st.title("Checklist de Rotulado — Resolución 5109 de 2005")
 
+# ===========================================
+# PERSISTENCIA — verificación activa (SQLite WAL, ver persistencia.py)
+#  La verificación abierta viaja en la URL (?v=<id>): un refresco la reabre
+# ===========================================
+@st.cache_resource
+def _almacen_db():
+    return AlmacenVerificaciones(RUTA_DB)
+
+db = _almacen_db()
+
+# Planes del checklist (ver checklist.py): cada verificación guarda el id del suyo
+planes = planes_disponibles()
+archivo_por_plan = {cargar_plan(ruta).id: archivo for archivo, ruta in planes.items()}
+
+def _abrir_verificacion(verif_id):
+    datos = db.cargar(verif_id)
+    if datos is None:
+        return
+    for campo, valor in datos["encabezado"].items():
+        st.session_state[f"{campo}_5109_v5"] = valor
+    # Se reabre con su propio plan (las guardadas antes de los planes usan el vigente)
+    if datos["plan"] in archivo_por_plan:
+        st.session_state.plan_5109_v5 = archivo_por_plan[datos["plan"]]
+    st.session_state.verif_id_5109_v5 = verif_id
+    st.session_state.encabezado_guardado_5109_v5 = datos["encabezado"]
+    # Estados/notas/evidencias se aplican cuando el plan del checklist ya está cargado (ver ESTADO)
+    st.session_state.verif_cargada_5109_v5 = datos
+    st.query_params["v"] = str(verif_id)
+
+def _nueva_verificacion():
+    for campo in CAMPOS_ENCABEZADO:
+        st.session_state.pop(f"{campo}_5109_v5", None)
+    st.session_state.verif_id_5109_v5 = None
+    st.session_state.encabezado_guardado_5109_v5 = None
+    st.session_state.verif_cargada_5109_v5 = {"encabezado": {}, "plan": "", "respuestas": {}, "evidencias": {}}
+    st.query_params.pop("v", None)   # conserva otros parámetros (p. ej. ?admin=1)
+
+def _cambiar_plan():
+    # Otro plan es otra verificación: se conserva el encabezado, no las respuestas ni las evidencias
+    st.session_state.verif_id_5109_v5 = None
+    st.session_state.encabezado_guardado_5109_v5 = None
+    st.session_state.verif_cargada_5109_v5 = {"encabezado": {}, "plan": "", "respuestas": {}, "evidencias": {}}
+    st.query_params.pop("v", None)
+
+# Registro sanitario INVIMA importado (ver registro_invima.py): compartido por el proceso
+@st.cache_resource
+def _registro_invima():
+    return RegistroINVIMA(RUTA_DB_INVIMA)
+
+registro_invima = _registro_invima()
+registro_invima.refrescar()   # importaciones hechas desde la línea de comandos con la app abierta
+
+def _prellenar_invima():
+    # Callback: corre antes del rerun, cuando aún se pueden escribir las claves de los widgets
+    ficha = registro_invima.consultar(st.session_state.get("invima_registro_5109_v5", ""))
+    if ficha is None:
+        return
+    st.session_state.invima_estado_activo_5109_v5 = ficha.vigente
+    if not st.session_state.get("producto_5109_v5", "").strip():
+        st.session_state.producto_5109_v5 = ficha.nombre
+    if not st.session_state.get("proveedor_5109_v5", "").strip():
+        st.session_state.proveedor_5109_v5 = ficha.titular
+    # El check "vigente" del mini checklist INVIMA se marca cuando el plan ya está cargado (ver ESTADO)
+    st.session_state.invima_vigente_5109_v5 = ficha.vigente
+
+if "verif_id_5109_v5" not in st.session_state:
+    st.session_state.verif_id_5109_v5 = None
+    v = st.query_params.get("v")
+    if v and v.isdigit():
+        _abrir_verificacion(int(v))
+
 # ===========================================
 # SIDEBAR / DATOS GENERALES
 # ===========================================
+st.session_state.setdefault("fecha_verif_5109_v5", datetime.now().strftime("%Y-%m-%d"))
 st.sidebar.header("Datos de la verificación")
-producto   = st.sidebar.text_input("Nombre del producto")
-proveedor  = st.sidebar.text_input("Fabricante / Importador / Reenvasador")
-responsable= st.sidebar.text_input("Responsable de la verificación")
-fecha_verif= st.sidebar.text_input("Fecha del informe (AAAA-MM-DD)", datetime.now().strftime("%Y-%m-%d"))
-invima_registro     = st.sidebar.text_input("Registro sanitario INVIMA (producto terminado)")
-invima_estado_activo= st.sidebar.checkbox("Verificado ACTIVO y coincidente en el portal INVIMA", value=False)
-invima_url          = st.sidebar.text_input("URL de consulta INVIMA (opcional)")
+producto   = st.sidebar.text_input("Nombre del producto", key="producto_5109_v5")
+proveedor  = st.sidebar.text_input("Fabricante / Importador / Reenvasador", key="proveedor_5109_v5")
+responsable= st.sidebar.text_input("Responsable de la verificación", key="responsable_5109_v5")
+fecha_verif= st.sidebar.text_input("Fecha del informe (AAAA-MM-DD)", key="fecha_verif_5109_v5")
+invima_registro     = st.sidebar.text_input("Registro sanitario INVIMA (producto terminado)", key="invima_registro_5109_v5",
+                                            on_change=_prellenar_invima)
+invima_estado_activo= st.sidebar.checkbox("Verificado ACTIVO y coincidente en el portal INVIMA", key="invima_estado_activo_5109_v5")
+invima_url          = st.sidebar.text_input("URL de consulta INVIMA (opcional)", key="invima_url_5109_v5")
+if invima_registro.strip() and len(registro_invima):
+    ficha_invima = registro_invima.consultar(invima_registro)
+    if ficha_invima is None:
+        st.sidebar.warning("El registro no figura en el registro INVIMA importado.")
+    else:
+        vence = f" — vence {ficha_invima.vencimiento}" if ficha_invima.vencimiento else ""
+        presentaciones = "".join(f"\n- {p}" for p in ficha_invima.presentaciones) or " -"
+        aviso = st.sidebar.success if ficha_invima.vigente else st.sidebar.error
+        aviso(
+            f"**{ficha_invima.nombre}** ({ficha_invima.marca or 'sin marca'})  \n"
+            f"Titular: {ficha_invima.titular or '-'}  \n"
+            f"Estado: {ficha_invima.estado or '-'}{vence}  \n"
+            f"Presentaciones autorizadas:{presentaciones}"
+        )
+        if invima_estado_activo and not ficha_invima.vigente:
+            st.sidebar.warning("Marcado como ACTIVO, pero el registro importado no está vigente.")
 nombre_pdf          = st.sidebar.text_input("Nombre del PDF (sin .pdf)", f"informe_5109_v5_{datetime.now().strftime('%Y%m%d')}")
 solo_no             = st.sidebar.checkbox("Mostrar solo 'No cumple'", value=False)
+anexo_completo      = st.sidebar.checkbox("Incluir anexo de evidencias en resolución completa", value=False)
+
+st.sidebar.header("Verificaciones guardadas")
+busqueda = st.sidebar.text_input("Buscar por producto, proveedor o registro INVIMA", key="busqueda_5109_v5")
+resultados = {r["id"]: r for r in db.buscar(busqueda, limite=20)}
+if resultados:
+    sel = st.sidebar.selectbox(
+        "Resultados", list(resultados), key="sel_verif_5109_v5",
+        format_func=lambda i: f"#{i} — {resultados[i]['producto'] or '(sin nombre)'} — "
+                              f"{resultados[i]['proveedor'] or '-'} — {resultados[i]['fecha_verif']}",
+    )
+    st.sidebar.button("Abrir verificación", on_click=_abrir_verificacion, args=(sel,))
+st.sidebar.button("Nueva verificación", on_click=_nueva_verificacion)
+
+with st.sidebar.expander("Registro INVIMA (fuera de línea)"):
+    if len(registro_invima):
+        st.caption(f"{len(registro_invima)} registros — importado {registro_invima.importado} "
+                   f"{f'({registro_invima.origen})' if registro_invima.origen else ''}")
+    else:
+        st.caption("Aún no se ha importado una exportación del registro.")
+    csv_invima = st.file_uploader("Exportación CSV del INVIMA", type=["csv"], key="csv_invima_5109_v5")
+    if csv_invima is not None and st.button("Importar registro"):
+        try:
+            with st.spinner("Importando registro…"):
+                n_invima = registro_invima.importar_csv(csv_invima, nombre_origen=csv_invima.name)
+        except RegistroInvalido as e:
+            st.error(f"No se pudo importar: {e}")
+        else:
+            st.success(f"{n_invima} registros importados.")
+    texto_invima = st.text_input("Buscar por nombre o marca", key="buscar_invima_5109_v5")
+    if texto_invima.strip():
+        st.dataframe(
+            [{"Registro": r.registro, "Producto": r.nombre, "Marca": r.marca, "Titular": r.titular,
+              "Vigente": r.vigente} for r in registro_invima.buscar(texto_invima)],
+            hide_index=True, use_container_width=True,
+        )
 
 # ===========================================
-# CHECKLIST — CATEGORÍAS E ÍTEMS
-#  Cada ítem: (titulo, que_verificar, referencia, aplica)
+# CHECKLIST — plan compilado desde checklists/*.json (ver checklist.py)
+#  Cada ítem: id estable, título, qué verificar, referencia, aplica y sub-checklist opcional
+#  Va antes de crear la verificación: el registro guarda el id del plan
 # ===========================================
-CATEGORIAS = {
-    # 1) INVIMA
-    "1. Verificación con INVIMA (registro sanitario)": [
-        ("Registro sanitario INVIMA impreso, vigente y coherente con el producto",
-        "Verificar con el siguiente checklist.",
-        "Resolución 5109/2005 Art. 5.8.",
-        "Producto terminado")
-    ],
-    "2. Ingredientes": [
-        ("Lista de ingredientes, aditivos y declaración de alérgenos",
-          "Con ayuda del mini checklist realizar revisión",
-          "Resolución 5109/2005 Art. 5.2.", "Producto terminado y Materia Prima")
-    ],
-    
-    "3. Contenido neto y peso escurrido": [
-         ("Contenido neto en cara principal con unidades SI",
-          "Que se declare el contenido neto en la cara principal de exhibición, utilizando unidades del Sistema Internacional (g, kg, mL, L), de forma legible, clara y sin incluir el peso o volumen del envase. Cuando se trate de un producto terminado, verificar adicionalmente que se declare el número de porciones conforme a la normativa aplicable.",
-          "Resolución 5109/2005 Art. 5.3", "Producto terminado y Materia Prima")
-    ],
-
-    "4. Información del fabricante y distribuidor": [ 
-        ("Nombre y dirección del responsable (fabricante / importador / reenvasador)",
-         "Verificar con mini checklis",
-         "Resolución 5109 de 2005, Art. 5.3; Ley 1480 de 2011", "Producto terminado y Materia Prima")
-    ],
-
-    "5. Identificación del lote y fecha de vencimiento": [
-        ("Lote y fecha de vencimiento",
-         "Para ambos casos verificar que diga lote y fecha de vencimiento impresa en el empaque",
-         "Resolución 5109/2005 Art. 5.5", "Producto terminado y Materia Prima")
-    ],
-
-    "7. Instrucciones de Uso": [
-        ("Instrucciones de uso, preparación y consumo (cuando aplique)",
-         "Incluir instrucciones claras y suficientes para el uso, preparación y consumo seguro y adecuado del alimento, cuando corresponda. Indicar de forma expresa la manera correcta de consumo o preparación (por ejemplo: “Agítese antes de usar”, “Listo para consumir”, “Servir frío”, “Agregar agua antes de usar”, “Porción sugerida”), asegurando que la información sea comprensible para el consumidor.",
-         "Resolución 5109 de 2005, Artículos 5.9 y 5.9.2",
-         "Producto terminado")
-    ],
-
-    "8. Condiciones de Conservación": [
-         ("‎ ",
-         "Declarar condiciones especiales de conservación para preservar inocuidad y vida útil (p. ej., refrigeración a 0-4 °C, almacenece a temperatura ambiente, etc).",
-         "Resolución 5109/2005 Art. 5.9.1 y 5.9.2.", "Producto terminado y Materia Prima")
-    ],
-
-    "9. Origen": [
-        ("País de origen",
-         "Declarar “Hecho en …” cuando aplique.",
-         "Resolución 5109/2005 Art. 5.4.2.", "Producto terminado y Materia Prima")
-    ],
-
-    "10. Idioma": [   
-        ("Idioma en español (o rótulo complementario si es importado)",
-         "Toda la información obligatoria debe estar en español; en importados, adherir rótulo complementario traducido.",
-         "Resolución 5109/2005 Art. 4.4", "Producto terminado y Materia Prima")
-    ],
-}
+if len(planes) > 1:
+    # Por defecto el mismo plan que usa la analítica para las verificaciones sin plan
+    #  (CHECKLIST_5109_PLAN); se siembra en session_state en vez de index= porque
+    #  _abrir_verificacion también fija la clave
+    st.session_state.setdefault("plan_5109_v5", archivo_por_defecto(planes))
+    plan = cargar_plan(planes[st.sidebar.selectbox("Checklist", list(planes), key="plan_5109_v5",
+                                                   on_change=_cambiar_plan)])
+else:
+    plan = cargar_plan()
+
+def _encabezado() -> dict:
+    return {
+        "producto": producto, "proveedor": proveedor, "responsable": responsable,
+        "fecha_verif": fecha_verif, "invima_registro": invima_registro,
+        "invima_estado_activo": invima_estado_activo, "invima_url": invima_url,
+    }
+
+def _verif_activa() -> int:
+    # El registro se crea con la primera respuesta (o al escribir el producto)
+    if st.session_state.verif_id_5109_v5 is None:
+        st.session_state.verif_id_5109_v5 = db.crear(_encabezado(), plan.id)
+        st.session_state.encabezado_guardado_5109_v5 = _encabezado()
+        st.query_params["v"] = str(st.session_state.verif_id_5109_v5)
+    return st.session_state.verif_id_5109_v5
+
+if st.session_state.verif_id_5109_v5 is None and producto.strip():
+    _verif_activa()
+elif st.session_state.verif_id_5109_v5 is not None and _encabezado() != st.session_state.get("encabezado_guardado_5109_v5"):
+    db.actualizar_encabezado(st.session_state.verif_id_5109_v5, _encabezado())
+    st.session_state.encabezado_guardado_5109_v5 = _encabezado()
 
 # ===========================================
 # ESTADO / NOTAS / EVIDENCIAS
+#  Respuestas: EstadoRespuestas compacto indexado por ordinal (ver estado.py)
+#  Evidencias: por id de ítem, lista de referencias {"sha", "name", "caption"};
+#  los bytes viven en un almacén compartido por el proceso (ver evidencias.py)
 # ===========================================
-if "status_5109_v5" not in st.session_state:
-    st.session_state.status_5109_v5 = {i[0]: "none" for c in CATEGORIAS.values() for i in c}
-if "note_5109_v5" not in st.session_state:
-    st.session_state.note_5109_v5   = {i[0]: "" for c in CATEGORIAS.values() for i in c}
+if "respuestas_5109_v5" not in st.session_state or st.session_state.respuestas_5109_v5.plan_id != plan.id:
+    st.session_state.respuestas_5109_v5 = EstadoRespuestas.para_plan(plan)
 if "evidence_5109_v5" not in st.session_state:
-    st.session_state.evidence_5109_v5 = {i[0]: [] for c in CATEGORIAS.values() for i in c}
-
-def _wrap(text: str, chunk: int = 110) -> str:
-    if not text:
-        return ""
-    s = str(text)
-    return "\\n".join([s[i:i+chunk] for i in range(0, len(s), chunk)])
+    # Los bytes viven en el almacén; aquí solo referencias
+    st.session_state.evidence_5109_v5 = {}
+st.session_state.setdefault("sesion_5109_v5", uuid.uuid4().hex[:12])
+sesion = st.session_state.sesion_5109_v5
+resp = st.session_state.respuestas_5109_v5
+
+@st.cache_resource
+def _almacen_evidencias():
+    # Lo desalojado de memoria se relee del disco; lo que ya no esté allí, de la base SQLite.
+    #  La cuota es por verificación y parte de lo que ya tiene guardado: recargar la página no la renueva
+    return AlmacenEvidencias(respaldo=db.blob_tipo, uso_inicial=db.uso_evidencias)
+
+almacen_ev = _almacen_evidencias()
+if st.session_state.verif_id_5109_v5 is not None:
+    almacen_ev.tocar(st.session_state.verif_id_5109_v5)
+
+@st.cache_resource
+def _ingestor():
+    return IngestorEvidencias()
+
+ingestor = _ingestor()
+
+def _limpiar_widgets(item):
+    # Sin esto, los widgets conservarían el valor anterior en vez del estado restaurado
+    st.session_state.pop(f"{item.id}_nota", None)
+    if item.sub is not None:
+        for check in item.sub.checks:
+            st.session_state.pop(f"sub_{item.id}_{check.id}", None)
+
+# Verificación recién abierta (o nueva): reemplaza respuestas y evidencias de la sesión
+#  (las guardadas antes de los ids estables usan el título como clave)
+cargada = st.session_state.pop("verif_cargada_5109_v5", None)
+if cargada is not None:
+    respuestas, evidencias = cargada["respuestas"], cargada["evidencias"]
+    if cargada["plan"] and cargada["plan"] != plan.id:
+        st.warning(f"Esta verificación se hizo con el checklist «{cargada['plan']}», que ya no está disponible: "
+                   f"se cargan solo los ítems que coinciden con «{plan.id}» y los cambios se guardan "
+                   f"como una verificación nueva.")
+        # No se mezclan respuestas de dos planes en el mismo registro
+        st.session_state.verif_id_5109_v5 = None
+        st.session_state.encabezado_guardado_5109_v5 = None
+        st.query_params.pop("v", None)
+    resp = st.session_state.respuestas_5109_v5 = EstadoRespuestas.para_plan(plan)
+    for it in plan.items:
+        estado_g, nota_g, sub_g = respuestas.get(it.id) or respuestas.get(it.titulo) or ("none", "", 0)
+        resp.fijar_estado(it.ordinal, estado_g)
+        resp.notas[it.ordinal] = nota_g
+        resp.subchecks[it.ordinal] = sub_g
+        _limpiar_widgets(it)
+    # Las imágenes no se precargan: el almacén las lee de la base cuando la grilla o el PDF las piden
+    st.session_state.evidence_5109_v5 = {it.id: list(evidencias.get(it.id) or evidencias.get(it.titulo) or [])
+                                         for it in plan.items}
+
+for it in plan.items:
+    st.session_state.evidence_5109_v5.setdefault(it.id, [])
+# Las tarjetas agregan referencias en sitio; construir_informe() lee este dict sin tocar
+#  st.session_state, así también sirve desde las descargas diferidas (fuera del hilo del script)
+evidencias_sesion = st.session_state.evidence_5109_v5
+
+def _guardar_respuesta(item):
+    db.guardar_respuesta(_verif_activa(), item.id, resp.estado(item.ordinal),
+                         resp.notas[item.ordinal], resp.subchecks[item.ordinal])
+
+# Registro encontrado en el registro INVIMA importado (ver _prellenar_invima)
+vigente_invima = st.session_state.pop("invima_vigente_5109_v5", None)
+item_invima = plan.por_id.get("invima")
+if vigente_invima is not None and item_invima is not None and item_invima.sub is not None:
+    ids_checks = [c.id for c in item_invima.sub.checks]
+    if "vigente" in ids_checks:
+        resp.fijar_check(item_invima.ordinal, ids_checks.index("vigente"), vigente_invima)
+        _limpiar_widgets(item_invima)
+        _guardar_respuesta(item_invima)
+
+# Instantánea binaria de las respuestas (guardar / restaurar al instante)
+#  La JSON lleva también el encabezado: importar_respuestas.py la importa como verificación completa
+def _instantanea_json() -> bytes:
+    return json.dumps(resp.a_dict(_encabezado()), ensure_ascii=False).encode("utf-8")
+
+st.sidebar.header("Instantánea de respuestas")
+st.sidebar.download_button("Descargar instantánea", data=resp.a_bytes(),
+                           file_name=f"respuestas_{plan.id}.e509", mime="application/octet-stream")
+st.sidebar.download_button("Descargar instantánea JSON (con encabezado)", data=_instantanea_json,
+                           file_name=f"respuestas_{plan.id}.json", mime="application/json", on_click="ignore")
+archivo_inst = st.sidebar.file_uploader("Restaurar instantánea (.e509 / .json)", type=["e509", "json"], key="inst_5109_v5")
+if archivo_inst is not None and st.sidebar.button("Restaurar respuestas"):
+    try:
+        restaurada = desde_instantanea(archivo_inst.getvalue())
+        cambios = restaurada.diff(resp)
+    except InstantaneaInvalida as e:
+        st.sidebar.error(f"No se pudo restaurar: {e}")
+    else:
+        resp = st.session_state.respuestas_5109_v5 = restaurada
+        # Solo se reescriben en la base los ítems que cambiaron
+        for i in cambios:
+            _limpiar_widgets(plan.items[i])
+            _guardar_respuesta(plan.items[i])
+        st.sidebar.success(f"Instantánea restaurada ({len(cambios)} ítem(s) con cambios).")
 
 # ===========================================
 # UI — CHECKLIST
 # ===========================================
-st.header("Checklist — Resolución 5109/2005")
+st.header(f"Checklist — {plan.nombre}")
 st.markdown("Responde con ✅ Cumple / ❌ No cumple / ⚪ No aplica. Si marcas **No cumple**, podrás **adjuntar evidencia**.")
 
-for categoria, items in CATEGORIAS.items():
-    st.subheader(categoria)
-    for (titulo, que_verificar, referencia, aplica) in items:
-        estado = st.session_state.status_5109_v5.get(titulo, "none")
-        if solo_no and estado != "no":
-            continue
-
-        st.markdown(f"### {titulo}")
-        st.markdown(f"**Qué verificar:** {que_verificar}")
-        st.markdown(f"**Referencia normativa:** {referencia}")
-        st.caption(f"Aplica a: {aplica}")
-
-        if titulo == "Lote y fecha de vencimiento":
-            st.markdown("#### Mini checklist — Identificación del lote y fecha de vencimiento")
-            checks_lote_fv = {
-                "Lote impreso en el empaque, legible, visible e indeleble, que permite la trazabilidad del producto (ej.: L230401, LOTE230401)": False,
-                "Fecha de vencimiento o duración mínima impresa, clara, legible e indeleble, con formato permitido y denominación válida (Vence, Expira, Consumase antes de, etc.)": False,
-            }
-            
-            for check in checks_lote_fv:
-                checks_lote_fv[check] = st.checkbox(
-                    check,
-                    key=f"lote_fv_{check}"
-                )
-
-
-        if titulo == "Lista de ingredientes, aditivos y declaración de alérgenos":
-            
-            with st.expander("Checklist verificación — Ingredientes", expanded=False):
-                
-                checklist_ingredientes = [
-                    "Lista encabezada con la palabra “Ingredientes:”",
-                    "Ingredientes declarados en orden decreciente de peso y no se omiten ingredientes presentes en la formulación (Validar con Ficha Técnica)",
-                    "Aditivos alimentarios declarados  ej., Conservante (Sorbato de potasio) o Colorantes(naturales o artificiales)",
-                    "Alérgenos declarados cuando aplique gluten (trigo/cebada/centeno/avena), huevo, leche (incl. lactosa), soya, maní, frutos secos, pescado, crustáceos, mostaza, apio, sésamo, sulfitos ≥10 mg/kg."
-                ]
-                
-                for item in checklist_ingredientes:
-                    st.checkbox(
-                        item,
-                        key=f"cp_ing_{item}"
-                    )
-
-
-        if titulo == "Registro sanitario INVIMA impreso, vigente y coherente con el producto":
-            st.markdown("#### Mini checklist — Verificación INVIMA")
-            checks_invima = {
-               "Registro sanitario INVIMA impreso en el empaque de forma visible, legible e indeleble": False,
-               "Registro sanitario vigente según portal INVIMA": False,
-               "Marca declarada coincide con la registrada ante INVIMA (cuando aplique)": False,
-               "Nombre del producto coincide con el nombre aprobado en el registro sanitario (incluye nombre de fantasia si aplica)": False,
-               "Denominación del alimento corresponde a su verdadera naturaleza": False,
-               "Presentaciones comerciales coinciden con las autorizadas en el registro": False,
-            }
-            
-            for check in checks_invima:
-                checks_invima[check] = st.checkbox(
-                    check,
-                    key=f"invima_{check}"
-                )
-
-        if titulo == "Nombre y dirección del responsable (fabricante / importador / reenvasador)":
-            st.markdown("#### Mini checklist — Información del responsable del alimento")
-            checklist_responsable = [
-                "Razón social del responsable del alimento declarada de forma clara y legible",
-                "Dirección completa del responsable declarada (incluye ciudad/municipio y país cuando aplique)",
-                "Uso correcto de la expresión normativa según corresponda: “FABRICADO POR”, “ENVASADO POR” o “FABRICADO, ENVASADO O REEMPACADO POR … PARA …”",
-                "Para producto terminado, se declara al menos un dato de contacto del responsable (teléfono, correo electrónico u otro medio)",
-                "Cuando el producto figure bajo la marca Juan Valdez, se verifica que la información del responsable corresponda a la Federación Nacional de Cafeteros de Colombia y que la marca sea declarada correctamente como marca registrada de la Federación Nacional de Cafeteros."
-            ]
-            
-            for item in checklist_responsable:
-                st.checkbox(
-                    item,
-                    key=f"resp_{item}"
-                )
-
-        if titulo == "Contenido neto en cara principal con unidades SI":
-            st.markdown("#### Anexo — Altura mínima de números y letras del contenido neto (Res. 5109/2005)")
-            st.markdown("""
-            **a) Según el área de la cara principal de exhibición**
-
-| Área de la cara principal (cm²) | Altura mínima números y letras (impreso / adhesivo) | Altura mínima rótulo soplado, formado o moldeado |
-|-------------------------------|-----------------------------------------------------|--------------------------------------------------|
-| Hasta 16                      | 2 mm                                                | 3 mm                                             |
-| > 16 a 100                    | 3 mm                                                | 4 mm                                             |
-| > 100 a 225                   | 4 mm                                                | 6 mm                                             |
-| > 225 a 400                   | 5 mm                                                | 7 mm                                             |
-| > 400 a 625                   | 7 mm                                                | 8 mm                                             |
-| > 625 a 900                   | 9 mm                                                | 9 mm                                             |
-| > 900                         | Proporcional (≥ 9 mm)                               | Proporcional (≥ 9 mm)                            |
-""")
-            st.markdown("""
-**b) Criterio técnico de referencia internacional — Directiva 76/211/EEC (Unión Europea)**  
-*(Referencia informativa; no sustituye la Resolución 5109/2005)*
-
-| Contenido neto | Altura mínima de números y letras |
-|---------------|-----------------------------------|
-| ≤ 200 g o mL  | 3 mm                              |
-| > 200 g o mL hasta 1 kg o L       | 4 mm                              |
-| > 1 kg o L    | 6 mm                              |
-""")
-
-        c1, c2, c3, _ = st.columns([0.12, 0.12, 0.12, 0.64])
-        with c1:
-            if st.button("✅ Cumple", key=f"{titulo}_yes"):
-                st.session_state.status_5109_v5[titulo] = "yes"
-        with c2:
-            if st.button("❌ No cumple", key=f"{titulo}_no"):
-                st.session_state.status_5109_v5[titulo] = "no"
-        with c3:
-            if st.button("⚪ No aplica", key=f"{titulo}_na"):
-                st.session_state.status_5109_v5[titulo] = "na"
-
-        estado = st.session_state.status_5109_v5[titulo]
-        if estado == "yes":
-            st.markdown("<div style='background:#e6ffed;padding:6px;border-radius:5px;'>✅ Cumple</div>", unsafe_allow_html=True)
-        elif estado == "no":
-            st.markdown("<div style='background:#ffe6e6;padding:6px;border-radius:5px;'>❌ No cumple</div>", unsafe_allow_html=True)
-        elif estado == "na":
-            st.markdown("<div style='background:#f2f2f2;padding:6px;border-radius:5px;'>⚪ No aplica</div>", unsafe_allow_html=True)
-        else:
-            st.markdown("<div style='background:#fff;padding:6px;border-radius:5px;'>Sin responder</div>", unsafe_allow_html=True)
-
-        nota = st.text_area("Observación (opcional)", value=st.session_state.note_5109_v5.get(titulo, ""), key=f"{titulo}_nota")
-        st.session_state.note_5109_v5[titulo] = nota
-
-        if st.session_state.status_5109_v5[titulo] == "no":
-            st.markdown("**Adjunta evidencia (JPG/PNG):**")
-            files = st.file_uploader("Subir imágenes", type=["jpg","jpeg","png"], accept_multiple_files=True, key=f"upl_{titulo}")
-            if files:
-                caption = st.text_input("Descripción breve para estas imágenes (opcional)", key=f"cap_{titulo}")
-                if st.button("Agregar evidencia", key=f"btn_add_{titulo}"):
-                    for f in files:
-                        st.session_state.evidence_5109_v5[titulo].append({
-                            "name": f.name,
-                            "base64": base64.b64encode(f.read()).decode("utf-8"),
-                            "caption": caption or ""
-                        })
-                    st.success(f"Se agregaron {len(files)} imagen(es) a: {titulo}")
-            ev_list = st.session_state.evidence_5109_v5.get(titulo, [])
-            if ev_list:
-                st.markdown("**Evidencia acumulada:**")
-                cols = st.columns(4)
-                for idx, ev in enumerate(ev_list):
-                    img_bytes = base64.b64decode(ev["base64"])
-                    with cols[idx % 4]:
-                        st.image(img_bytes, caption=ev.get("caption") or ev.get("name"), use_column_width=True)
-
-        st.markdown("---")
+def _casillas(item, sub):
+    for bit, check in enumerate(sub.checks):
+        marcado = st.checkbox(check.texto, value=resp.check(item.ordinal, bit), key=f"sub_{item.id}_{check.id}")
+        if marcado != resp.check(item.ordinal, bit):
+            resp.fijar_check(item.ordinal, bit, marcado)
+            _guardar_respuesta(item)
+
+def _mini_checklist(item):
+    sub = item.sub
+    if sub.modo == "expander":
+        with st.expander(sub.titulo, expanded=False):
+            _casillas(item, sub)
+        return
+    st.markdown(f"#### {sub.titulo}")
+    if sub.modo == "anexo":
+        for bloque in sub.markdown:
+            st.markdown(bloque)
+    else:
+        _casillas(item, sub)
+
+# Cada tarjeta es un fragmento: un clic o una observación solo redibuja ese ítem
+@st.fragment
+def _tarjeta_item(item):
+    item_id = item.id
+    titulo = item.titulo
+    st.markdown(f"### {titulo}")
+    st.markdown(f"**Qué verificar:** {item.que_verificar}")
+    st.markdown(f"**Referencia normativa:** {item.referencia}")
+    st.caption(f"Aplica a: {item.aplica}")
+
+    if item.sub is not None:
+        _mini_checklist(item)
+
+    c1, c2, c3, _ = st.columns([0.12, 0.12, 0.12, 0.64])
+    nuevo = None
+    with c1:
+        if st.button("✅ Cumple", key=f"{item_id}_yes"):
+            nuevo = "yes"
+    with c2:
+        if st.button("❌ No cumple", key=f"{item_id}_no"):
+            nuevo = "no"
+    with c3:
+        if st.button("⚪ No aplica", key=f"{item_id}_na"):
+            nuevo = "na"
+    if nuevo is not None and nuevo != resp.estado(item.ordinal):
+        resp.fijar_estado(item.ordinal, nuevo)
+        _guardar_respuesta(item)
+        _pintar_metricas()
+
+    estado = resp.estado(item.ordinal)
+    if estado == "yes":
+        st.markdown("<div style='background:#e6ffed;padding:6px;border-radius:5px;'>✅ Cumple</div>", unsafe_allow_html=True)
+    elif estado == "no":
+        st.markdown("<div style='background:#ffe6e6;padding:6px;border-radius:5px;'>❌ No cumple</div>", unsafe_allow_html=True)
+    elif estado == "na":
+        st.markdown("<div style='background:#f2f2f2;padding:6px;border-radius:5px;'>⚪ No aplica</div>", unsafe_allow_html=True)
+    else:
+        st.markdown("<div style='background:#fff;padding:6px;border-radius:5px;'>Sin responder</div>", unsafe_allow_html=True)
+
+    nota = st.text_area("Observación (opcional)", value=resp.notas[item.ordinal], key=f"{item_id}_nota")
+    if nota != resp.notas[item.ordinal]:
+        resp.notas[item.ordinal] = nota
+        _guardar_respuesta(item)
+
+    if estado == "no":
+        st.markdown("**Adjunta evidencia (JPG/PNG):**")
+        files = st.file_uploader("Subir imágenes", type=["jpg","jpeg","png"], accept_multiple_files=True, key=f"upl_{item_id}")
+        if files:
+            caption = st.text_input("Descripción breve para estas imágenes (opcional)", key=f"cap_{item_id}")
+            if st.button("Agregar evidencia", key=f"btn_add_{item_id}"):
+                refs_item = st.session_state.evidence_5109_v5[item_id]
+                barra = st.progress(0.0, text="Validando imágenes…")
+
+                def _avance(hechos, total, r):
+                    barra.progress(hechos / total, text=f"{hechos}/{total} — {r.nombre}")
+
+                # Validación, hash y variantes en paralelo (ver ingesta.py); aquí solo se guarda
+                lote = ingestor.ingerir([(f.name, f.getvalue) for f in files],
+                                        ya_adjuntos={ev["sha"] for ev in refs_item}, progreso=_avance)
+                barra.empty()
+                agregadas = 0
+                verif_id = _verif_activa()
+                for r in lote:
+                    if r.estado == DUPLICADO:
+                        st.info(f"{r.nombre}: se omitió, {r.motivo}.")
+                        continue
+                    if r.estado != OK:
+                        st.warning(f"{r.nombre}: rechazada, {r.motivo}.")
+                        continue
+                    try:
+                        sha = almacen_ev.agregar(r.datos, verif_id, r.variantes, sha=r.sha)
+                    except CuotaExcedida as e:
+                        st.error(f"{r.nombre}: no se agregó, {e}.")
+                        break
+                    ref = {
+                        "name": r.nombre,
+                        "sha": sha,
+                        "caption": caption or ""
+                    }
+                    refs_item.append(ref)
+                    db.agregar_evidencia(verif_id, item_id, ref, r.datos,
+                                         r.variantes["mini"], r.variantes["impresion"])
+                    agregadas += 1
+                if agregadas:
+                    st.success(f"Se agregaron {agregadas} imagen(es) a: {titulo}")
+        ev_list = st.session_state.evidence_5109_v5.get(item_id, [])
+        if ev_list:
+            st.markdown("**Evidencia acumulada:**")
+            cols = st.columns(4)
+            for idx, ev in enumerate(ev_list):
+                with medir("imagen_obtener"):
+                    img_bytes = almacen_ev.variante(ev["sha"], "mini")
+                with cols[idx % 4], medir("st_image"):
+                    st.image(img_bytes, caption=ev.get("caption") or ev.get("name"), use_column_width=True)
+
+    st.markdown("---")
 
 # ===========================================
 # MÉTRICAS
+#  Marcador fijo debajo del checklist: lo pintan el rerun completo y la tarjeta cuyo
+#  estado cambió (un st.empty externo se reemplaza desde el fragmento), sin refresco periódico
 # ===========================================
-yes_count = sum(1 for v in st.session_state.status_5109_v5.values() if v == "yes")
-no_count  = sum(1 for v in st.session_state.status_5109_v5.values() if v == "no")
-answered_count = yes_count + no_count
-percent = round((yes_count / answered_count * 100), 1) if answered_count > 0 else 0.0
-st.metric("Cumplimiento total (sobre ítems contestados)", f"{percent}%")
-st.write(
-    f"CUMPLE: {yes_count} — NO CUMPLE: {no_count} — "
-    f"NO APLICA: {sum(1 for v in st.session_state.status_5109_v5.values() if v == 'na')} — "
-    f"SIN RESPONDER: {sum(1 for v in st.session_state.status_5109_v5.values() if v == 'none')}"
-)
+zona_checklist = st.container()
+marcador_metricas = st.empty()
+
+def _pintar_metricas():
+    with medir("metricas"):
+        conteo = st.session_state.respuestas_5109_v5.conteo()
+        yes_count, no_count = conteo["yes"], conteo["no"]
+        answered_count = yes_count + no_count
+        percent = round((yes_count / answered_count * 100), 1) if answered_count > 0 else 0.0
+        with marcador_metricas.container():
+            st.metric("Cumplimiento total (sobre ítems contestados)", f"{percent}%")
+            st.write(
+                f"CUMPLE: {yes_count} — NO CUMPLE: {no_count} — "
+                f"NO APLICA: {conteo['na']} — "
+                f"SIN RESPONDER: {conteo['none']}"
+            )
+
+with zona_checklist:
+    for categoria in plan.categorias:
+        # Carga perezosa: los ítems de la categoría solo se dibujan cuando se despliega
+        if not st.toggle(f"**{categoria.titulo}**", key=f"cat_{categoria.id}"):
+            continue
+        with medir("categoria", categoria=categoria.id):
+            for item in categoria.items:
+                if solo_no and resp.estado(item.ordinal) != "no":
+                    continue
+                _tarjeta_item(item)
+
+_pintar_metricas()
 
 # ===========================================
-# PDF (horizontal) — portada (v5) + evidencias
+# INFORME — datos de la sesión → motor headless (informe.py)
 # ===========================================
-def generar_pdf():
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=landscape(A4),
-        leftMargin=8*mm, rightMargin=8*mm,
-        topMargin=8*mm, bottomMargin=8*mm
+def _obtener_imagen(sha, tipo):
+    return almacen_ev.obtener(sha) if tipo == "original" else almacen_ev.variante(sha, tipo)
+
+def construir_informe() -> Informe:
+    items = [
+        ItemInforme(
+            titulo=it.titulo,
+            referencia=it.referencia,
+            estado=resp.estado(it.ordinal),
+            nota=resp.notas[it.ordinal],
+            evidencias=list(evidencias_sesion.get(it.id, [])),
+            subchecks=[[c.texto, resp.check(it.ordinal, bit)] for bit, c in enumerate(it.sub.checks)]
+                      if it.sub is not None else [],
+        )
+        for it in plan.items
+    ]
+    return Informe(
+        producto=producto, proveedor=proveedor, responsable=responsable,
+        fecha_verif=fecha_verif, invima_registro=invima_registro,
+        invima_estado_activo=invima_estado_activo, invima_url=invima_url,
+        solo_no=solo_no, anexo_completo=anexo_completo, items=items,
     )
-    styles = getSampleStyleSheet()
-    style_header = ParagraphStyle("header", parent=styles["Normal"], fontSize=9, leading=11)
-    style_cell   = ParagraphStyle("cell",   parent=styles["Normal"], fontSize=8, leading=10)
-
-    story = []
-    # Portada v5
-    fecha_str = fecha_verif or datetime.now().strftime("%Y-%m-%d")
-    portada = (
-        f"<b>Informe de verificación — Rotulado general (Res. 5109/2005 v5)</b><br/>"
-        f"<b>Fecha:</b> {fecha_str} &nbsp;&nbsp; "
-        f"<b>Producto:</b> {producto or '-'} &nbsp;&nbsp; "
-        f"<b>Responsable:</b> {responsable or '-'}<br/>"
-        f"<b>Fabricante/Importador:</b> {proveedor or '-'} &nbsp;&nbsp; "
-        f"<b>Registro INVIMA:</b> {invima_registro or '-'} &nbsp;&nbsp; "
-        f"<b>Estado:</b> {'ACTIVO y coincidente' if invima_estado_activo else 'No verificado/No activo'}"
-    )
-    if invima_url.strip():
-        portada += f" &nbsp;&nbsp; <b>Consulta:</b> {invima_url}"
-    story.append(Paragraph(portada, style_header))
-    story.append(Spacer(1, 4*mm))
-    story.append(Paragraph(f"<b>Cumplimiento (sobre ítems contestados):</b> {percent}%", style_header))
-    story.append(Spacer(1, 4*mm))
-
-    if solo_no:
-        hay_no = any(v == "no" for v in st.session_state.status_5109_v5.values())
-        if not hay_no:
-            story.append(Paragraph(
-                "<b>No se registran ítems en estado NO CUMPLE.</b>",
-                style_header
-            ))
-            doc.build(story)
-            buf.seek(0)
-            return buf            
-    
-    # Tabla
-    data = [["Ítem", "Estado", "Observación", "Referencia"]]
-    for items in CATEGORIAS.values():
-        for (titulo, _, referencia, _) in items:
-            estado_val = st.session_state.status_5109_v5.get(titulo, "none")
-
-            if solo_no and estado_val != "no":
-                continue
-                
-            estado_humano = (
-                "Cumple" if estado_val == "yes"
-                else "No cumple" if estado_val == "no"
-                else "No aplica" if estado_val == "na"
-                else "Sin responder"
-            )
-            obs = st.session_state.note_5109_v5.get(titulo, "") or "-"
-            obs = "-" if obs.strip() == "" else _wrap(obs, 110)
-            data.append([
-                Paragraph(str(titulo),        style_cell),
-                Paragraph(str(estado_humano), style_cell),
-                Paragraph(obs,                style_cell),
-                Paragraph(str(referencia),    style_cell),
-            ])
-
-    tbl = Table(data, colWidths=[105*mm, 25*mm, 80*mm, 55*mm], repeatRows=1)
-    tbl.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#f2f2f2")),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,0), 9),
-        ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("LEFTPADDING",(0,0), (-1,-1), 3),
-        ("RIGHTPADDING",(0,0), (-1,-1), 3),
-    ]))
-    story.append(tbl)
-
-    # Evidencias (página nueva)
-    any_ev = any(len(v) > 0 for v in st.session_state.evidence_5109_v5.values())
-    if any_ev:
-        story.append(PageBreak())
-        story.append(Paragraph("<b>Evidencia fotográfica</b>", style_header))
-        story.append(Spacer(1, 3*mm))
-        for titulo, ev_list in st.session_state.evidence_5109_v5.items():
-            if not ev_list:
-                continue
-            story.append(Paragraph(f"<b>Ítem:</b> {titulo}", style_header))
-            story.append(Paragraph("<b>Evidencia de incumplimiento:</b>", style_header))
-            story.append(Spacer(1, 2*mm))
-            for ev in ev_list:
-                try:
-                    img_bytes = base64.b64decode(ev["base64"])
-                    story.append(RLImage(BytesIO(img_bytes), width=85*mm, height=55*mm))
-                    if ev.get("caption"):
-                        story.append(Paragraph(ev["caption"], style_cell))
-                    story.append(Spacer(1, 3*mm))
-                except Exception as e:
-                    story.append(Paragraph(f"<i>⚠️ Error al cargar imagen {ev.get('name', '')}: {e}</i>", style_cell))
-            story.append(Spacer(1, 4*mm))
-
-    doc.build(story)
-    buf.seek(0)
-    return buf
 
 # ===========================================
-# EXPORTAR PDF
+# EXPORTAR PDF (en segundo plano, memoizado por huella del informe)
 # ===========================================
+@st.cache_resource
+def _generador_pdf():
+    return GeneradorPDF()
+
 st.subheader("Generar informe PDF")
-if st.button("Generar PDF"):
-    pdf_buffer = generar_pdf()
+generador = _generador_pdf()
+
+# Fragmento estático: solo se sondea (rerun del fragmento) mientras el build de la sesión
+#  está en curso; el informe y su huella se recalculan en el rerun completo o al interactuar
+INTERVALO_SONDEO_PDF = 1.0
+
+def _pdf_en_curso() -> bool:
+    tarea = generador.tarea(st.session_state.get("pdf_tarea_5109_v5", ""))
+    return tarea is not None and tarea.error is None and not tarea.terminada
+
+def _leer_pdf() -> bytes:
+    # Data diferida: corre al hacer clic (fuera del hilo del script) y lee el spool solo para
+    #  esa descarga; nada queda en session_state. Se usa el informe de ese momento (las tarjetas
+    #  pudieron cambiarlo sin rerun de esta sección): si su PDF no está, el generador lo construye
+    #  y lo guarda en su cache, así los clics siguientes sobre el mismo informe son inmediatos
+    return generador.obtener(construir_informe(), _obtener_imagen)
+
+def _contenido_pdf():
+    informe_actual = construir_informe()
+    huella_actual = huella(informe_actual)
     file_name = (nombre_pdf.strip() or f"informe_5109_v5_{datetime.now().strftime('%Y%m%d')}") + ".pdf"
-    st.download_button("Descargar PDF", data=pdf_buffer, file_name=file_name, mime="application/pdf")
+
+    if generador.listo(huella_actual):
+        st.download_button("Descargar PDF", data=_leer_pdf, file_name=file_name, mime="application/pdf",
+                           on_click="ignore")
+        return
+    tarea = generador.tarea(huella_actual)
+    if tarea is None or tarea.error is not None:
+        if tarea is not None:
+            st.error(tarea.mensaje)
+        if st.button("Generar PDF"):
+            tarea = generador.solicitar(informe_actual, _obtener_imagen)
+            st.session_state.pdf_tarea_5109_v5 = tarea.clave
+    if tarea is not None and tarea.error is None:
+        st.progress(tarea.progreso, text=tarea.mensaje)
+
+def _es_rerun_de_fragmento() -> bool:
+    # st.rerun(scope="fragment") solo se admite si este run es de fragmentos (no uno completo,
+    #  p. ej. AppTest o un clic que Streamlit fusionó con un rerun completo pendiente)
+    ctx = get_script_run_ctx()
+    return ctx is not None and bool(ctx.fragment_ids_this_run)
+
+def _seccion_pdf(con_temporizador):
+    _contenido_pdf()
+    if con_temporizador:
+        if not _pdf_en_curso():
+            st.rerun()   # un rerun completo vuelve a dibujar la sección sin temporizador
+    elif _pdf_en_curso():
+        if _es_rerun_de_fragmento():
+            time.sleep(INTERVALO_SONDEO_PDF)
+            st.rerun(scope="fragment")
+        else:
+            st.rerun()   # el rerun completo encuentra el build en curso y usa el temporizador
+
+# Build en curso al llegar un rerun completo (no admite st.rerun(scope="fragment")): temporizador
+sondeo_pdf = _pdf_en_curso()
+st.fragment(run_every=INTERVALO_SONDEO_PDF if sondeo_pdf else None)(_seccion_pdf)(sondeo_pdf)
+
+# Verificación guardada (JSON + evidencias) para re-emitir informes con lote_informes.py
+#  El ZIP se arma recién al hacer clic (data diferida), en un spool y sin pasar los
+#  originales por la cache compartida (no desplaza las miniaturas de otras sesiones)
+def _zip_verificacion(base):
+    def leer():
+        informe = construir_informe()
+        with empaquetar_zip(informe, base, lambda sha, tipo: almacen_ev.variante(sha, tipo, cachear=False)) as spool:
+            return spool.read()
+    return leer
+
+# El JSON lleva el id de la verificación: los ZIP se descomprimen juntos para lote_informes.py
+#  y dos verificaciones descargadas el mismo día no pueden compartir nombre
+base_zip = nombre_pdf.strip() or f"informe_5109_v5_{datetime.now().strftime('%Y%m%d')}"
+if st.session_state.verif_id_5109_v5 is not None:
+    base_zip += f"_verif{st.session_state.verif_id_5109_v5}"
+st.download_button("Guardar verificación (ZIP)", data=_zip_verificacion(base_zip),
+                   file_name=base_zip + ".zip", mime="application/zip", on_click="ignore")
+
+# ===========================================
+# RENDIMIENTO — métricas del proceso (metricas.py)
+#  Se vuelcan a RUTA_METRICAS (formato Prometheus); el panel se ve con
+#  CHECKLIST_5109_ADMIN=1 o ?admin=1
+# ===========================================
+# Las métricas de una sesión o verificación inactiva desaparecen como su cuota (TTL_INACTIVIDAD)
+REGISTRO.fijar("session_state_bytes", tamano_aprox(st.session_state.to_dict()), ttl=TTL_INACTIVIDAD, sesion=sesion)
+if st.session_state.verif_id_5109_v5 is not None:
+    REGISTRO.fijar("evidencias_verificacion_bytes", almacen_ev.uso(st.session_state.verif_id_5109_v5),
+                   ttl=TTL_INACTIVIDAD, verificacion=st.session_state.verif_id_5109_v5)
+for clave, valor in almacen_ev.estadisticas().items():
+    REGISTRO.fijar(f"evidencias_{clave}", valor)
+REGISTRO.fijar("proceso_rss_pico_bytes", memoria_proceso())
+REGISTRO.fijar("reportlab_cargado", int("reportlab" in sys.modules))   # 0 hasta el primer PDF
+REGISTRO.observar("rerun", time.perf_counter() - _t_rerun)
+try:
+    REGISTRO.escribir_prometheus()
+except OSError as e:
+    st.sidebar.warning(f"No se pudieron escribir las métricas en {RUTA_METRICAS}: {e}")
+
+if os.environ.get("CHECKLIST_5109_ADMIN") == "1" or st.query_params.get("admin") == "1":
+    with st.sidebar.expander("Rendimiento (admin)"):
+        tiempos, gauges = REGISTRO.tabla()
+        st.dataframe(tiempos, hide_index=True, use_container_width=True)
+        st.dataframe(gauges, hide_index=True, use_container_width=True)
+        st.caption(f"Archivo Prometheus: {RUTA_METRICAS}")
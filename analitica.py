@@ -0,0 +1,112 @@
+
+# analitica.py
+# Analítica de cumplimiento sobre las verificaciones guardadas (pandas, vectorizado)
+# - Carga columnar: una fila por (verificación, ítem) con banderas `no` / `contestado`
+# - Agregados por ítem, proveedor, mes e ítem×mes: suma de `no` y de `contestado`
+#   (el ítem es el par (plan, ítem): el mismo id en dos planes son ítems distintos)
+# - Actualización incremental: solo se leen las verificaciones con `actualizado` ≥ última marca;
+#   su aporte anterior se resta y el nuevo se suma, sin recalcular todo el histórico
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+CLAVES_AGREGADOS = {
+    "item":      ["plan", "item"],
+    "proveedor": ["proveedor"],
+    "mes":       ["mes"],
+    "item_mes":  ["plan", "item", "mes"],
+}
+
+CONSULTA_FILAS = """
+SELECT v.id AS verif_id,
+       v.proveedor AS proveedor,
+       substr(v.fecha_verif, 1, 7) AS mes,
+       v.actualizado AS actualizado,
+       v.plan_id AS plan,
+       r.item AS item,
+       (r.estado = 'no') AS no,
+       (r.estado IN ('yes', 'no')) AS contestado
+FROM verificaciones v
+JOIN respuestas r ON r.verif_id = v.id
+WHERE v.actualizado >= ?
+"""
+
+COLUMNAS = ["verif_id", "proveedor", "mes", "plan", "item", "no", "contestado"]
+
+
+def _aporte(filas: pd.DataFrame, claves) -> pd.DataFrame:
+    return filas.groupby(claves, sort=False)[["no", "contestado"]].sum()
+
+
+def tasa(agregado: pd.DataFrame) -> pd.DataFrame:
+    """Agrega la columna `tasa_no` (no cumple / contestados) sin dividir por cero."""
+    out = agregado[agregado["contestado"] > 0].copy()
+    out["tasa_no"] = out["no"] / out["contestado"]
+    return out
+
+
+def tendencia(serie: pd.Series) -> pd.Series:
+    """Recta de mínimos cuadrados sobre una serie ordenada (p. ej. tasa mensual)."""
+    if len(serie) < 2:
+        return serie.copy()
+    x = np.arange(len(serie))
+    pendiente, intercepto = np.polyfit(x, serie.to_numpy(dtype=float), 1)
+    return pd.Series(intercepto + pendiente * x, index=serie.index)
+
+
+class AnaliticaCumplimiento:
+    def __init__(self, plan_por_defecto: str = ""):
+        # Las verificaciones anteriores a los planes (plan_id '') cuentan como del plan por defecto
+        self.plan_por_defecto = plan_por_defecto
+        self._lock = threading.Lock()
+        self.filas = pd.DataFrame({c: pd.Series(dtype="int64" if c in ("verif_id", "no", "contestado") else "object")
+                                   for c in COLUMNAS})
+        self.agregados = {k: _aporte(self.filas, claves) for k, claves in CLAVES_AGREGADOS.items()}
+        self.marca = ""
+
+    def actualizar(self, db) -> int:
+        """Incorpora las verificaciones nuevas o modificadas; devuelve cuántas se leyeron."""
+        with self._lock:
+            with db.conexion() as con:
+                nuevas = pd.read_sql_query(CONSULTA_FILAS, con, params=(self.marca,))
+            if nuevas.empty:
+                return 0
+            marca = nuevas["actualizado"].max()
+            nuevas = nuevas[COLUMNAS].copy()
+            nuevas["mes"] = nuevas["mes"].where(nuevas["mes"].str.len() == 7, "sin fecha")
+            nuevas["plan"] = nuevas["plan"].replace("", self.plan_por_defecto)
+
+            cambiadas = self.filas["verif_id"].isin(nuevas["verif_id"].unique())
+            viejas = self.filas[cambiadas]
+            for k, claves in CLAVES_AGREGADOS.items():
+                agg = self.agregados[k]
+                if not viejas.empty:
+                    agg = agg.sub(_aporte(viejas, claves), fill_value=0)
+                agg = agg.add(_aporte(nuevas, claves), fill_value=0)
+                self.agregados[k] = agg[agg["contestado"] > 0].astype("int64")
+
+            self.filas = pd.concat([self.filas[~cambiadas], nuevas], ignore_index=True)
+            self.marca = marca
+            return int(nuevas["verif_id"].nunique())
+
+    @property
+    def n_verificaciones(self) -> int:
+        return int(self.filas["verif_id"].nunique())
+
+    def por_item(self) -> pd.DataFrame:
+        return tasa(self.agregados["item"]).sort_values("tasa_no", ascending=False)
+
+    def por_proveedor(self, min_contestados: int = 1) -> pd.DataFrame:
+        agg = tasa(self.agregados["proveedor"])
+        return agg[agg["contestado"] >= min_contestados].sort_values("tasa_no", ascending=False)
+
+    def por_mes(self) -> pd.DataFrame:
+        agg = tasa(self.agregados["mes"]).drop(index="sin fecha", errors="ignore").sort_index()
+        agg["tendencia"] = tendencia(agg["tasa_no"])
+        return agg
+
+    def item_por_mes(self) -> pd.DataFrame:
+        """Tasa de no cumplimiento mensual por ítem (columnas = pares (plan, ítem))."""
+        return tasa(self.agregados["item_mes"])["tasa_no"].unstack(["plan", "item"]).sort_index()
@@ -0,0 +1,292 @@
+
+# benchmarks/bench_5109.py
+# Benchmarks reproducibles (headless) del checklist 5109
+#   python benchmarks/bench_5109.py [--rapido] [-o resultados.json]
+# - rerun: tiempo de un rerun completo de App.py con streamlit.testing (AppTest),
+#   con todas las categorías desplegadas, por n.º de ítems y largo de notas
+#   (cada configuración corre en un subproceso: plan y base de datos propios)
+# - pdf: tiempo y memoria pico (tracemalloc) de informe.generar_pdf() en una matriz de
+#   ítems × largo de notas (_wrap) × n.º de imágenes × resolución × filtro solo_no
+# - variantes: tiempo de imagenes.generar_variantes() por resolución
+# - arranque: en un proceso nuevo, importación de los módulos de la app (sin Streamlit),
+#   si ReportLab quedó cargado, y primer PDF (carga perezosa de ReportLab) frente al segundo
+# Salida: JSON con metadatos del entorno para comparar versiones
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MATRIZ_COMPLETA = {
+    "rerun_items":  [9, 50, 200],
+    "rerun_notas":  [0, 500],
+    "pdf_items":    [10, 100, 500],
+    "pdf_notas":    [0, 200, 2000],
+    "pdf_imagenes": [0, 10, 50],
+    "resoluciones": [(1280, 960), (4000, 3000)],
+    "solo_no":      [False, True],
+    "repeticiones": 3,
+}
+MATRIZ_RAPIDA = {
+    "rerun_items":  [9, 50],
+    "rerun_notas":  [0, 500],
+    "pdf_items":    [10, 100],
+    "pdf_notas":    [0, 2000],
+    "pdf_imagenes": [0, 10],
+    "resoluciones": [(1280, 960)],
+    "solo_no":      [False, True],
+    "repeticiones": 2,
+}
+
+
+def _resumen_tiempos(tiempos) -> dict:
+    return {"min_s": min(tiempos), "mediana_s": statistics.median(tiempos), "n": len(tiempos)}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=RAIZ, text=True).strip()
+    except Exception:
+        return None
+
+
+# ===========================================
+# DATOS SINTÉTICOS
+# ===========================================
+def _plan_sintetico(n_items: int) -> dict:
+    """Plan del checklist con n_items, basado en el plan real (se repiten sus ítems)."""
+    with open(os.path.join(RAIZ, "checklists", "res_5109_v5.json"), encoding="utf-8") as fh:
+        base = json.load(fh)
+    originales = [it for c in base["categorias"] for it in c["items"]]
+    categorias = []
+    for i in range(n_items):
+        it = dict(originales[i % len(originales)], id=f"i{i}")
+        if i % 5 == 0:
+            categorias.append({"id": f"c{len(categorias)}", "titulo": f"{len(categorias) + 1}. Categoría", "items": []})
+        categorias[-1]["items"].append(it)
+    return dict(base, id=f"bench_{n_items}", categorias=categorias)
+
+
+def _jpeg(ancho: int, alto: int) -> bytes:
+    from PIL import Image
+    # Ruido (distinto en cada llamada) para un JPEG de tamaño parecido al de una foto real
+    img = Image.effect_noise((ancho, alto), 64).convert("RGB")
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+# ===========================================
+# RERUN (AppTest en subproceso)
+# ===========================================
+def _medir_rerun(n_items: int, largo_nota: int, repeticiones: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(RAIZ, "App.py"), default_timeout=120)
+    at.run()
+    for t in at.toggle:
+        t.set_value(True)
+    at.run()
+    if largo_nota:
+        for ta in at.text_area:
+            ta.input("x" * largo_nota)
+        at.run()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        at.run()
+        tiempos.append(time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(f"App.py lanzó una excepción: {at.exception[0].value}")
+    return {"items": n_items, "largo_nota": largo_nota, **_resumen_tiempos(tiempos)}
+
+
+def bench_rerun(matriz: dict) -> list:
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench5109_") as tmp:
+        for n_items, largo in itertools.product(matriz["rerun_items"], matriz["rerun_notas"]):
+            ruta_plan = os.path.join(tmp, f"plan_{n_items}.json")
+            with open(ruta_plan, "w", encoding="utf-8") as fh:
+                json.dump(_plan_sintetico(n_items), fh, ensure_ascii=False)
+            # Todo lo que App.py escribe queda en el directorio temporal: ni la base, el registro
+            #  INVIMA, las métricas ni las evidencias del despliegue se tocan
+            caso = f"{n_items}_{largo}"
+            env = dict(os.environ,
+                       CHECKLIST_5109_PLAN=ruta_plan,
+                       CHECKLIST_5109_DB=os.path.join(tmp, f"bench_{caso}.db"),
+                       CHECKLIST_5109_INVIMA_DB=os.path.join(tmp, f"invima_{caso}.db"),
+                       CHECKLIST_5109_METRICAS=os.path.join(tmp, f"metricas_{caso}.prom"),
+                       CHECKLIST_5109_DIR_EVIDENCIAS=os.path.join(tmp, f"evidencias_{caso}"))
+            proc = subprocess.run(
+                [sys.executable, __file__, "--_rerun", str(n_items), str(largo), str(matriz["repeticiones"])],
+                env=env, capture_output=True, text=True, cwd=RAIZ,
+            )
+            if proc.returncode != 0:
+                resultados.append({"items": n_items, "largo_nota": largo, "error": proc.stderr.strip()[-2000:]})
+            else:
+                resultados.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            print(f"rerun  items={n_items:<4} nota={largo:<5} {resultados[-1].get('mediana_s', 'error')}", file=sys.stderr)
+    return resultados
+
+
+# ===========================================
+# ARRANQUE (proceso nuevo por repetición)
+# ===========================================
+_SCRIPT_ARRANQUE = """
+import json, sys, time
+t0 = time.perf_counter()
+import checklist, estado, evidencias, informe, ingesta, metricas, persistencia, tareas_pdf
+t1 = time.perf_counter()
+cargado = "reportlab" in sys.modules
+from informe import Informe, ItemInforme, generar_pdf
+t2 = time.perf_counter()
+generar_pdf(Informe(items=[ItemInforme("x")]), None)
+t3 = time.perf_counter()
+generar_pdf(Informe(items=[ItemInforme("x")]), None)
+t4 = time.perf_counter()
+print(json.dumps({"importacion_s": t1 - t0, "reportlab_al_importar": cargado,
+                  "primer_pdf_s": t3 - t2, "segundo_pdf_s": t4 - t3}))
+"""
+
+
+def bench_arranque(matriz: dict) -> dict:
+    muestras = []
+    for _ in range(matriz["repeticiones"]):
+        salida = subprocess.check_output([sys.executable, "-c", _SCRIPT_ARRANQUE], cwd=RAIZ, text=True)
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+    resultado = {"reportlab_al_importar": any(m["reportlab_al_importar"] for m in muestras)}
+    for clave in ("importacion_s", "primer_pdf_s", "segundo_pdf_s"):
+        resultado[clave] = _resumen_tiempos([m[clave] for m in muestras])
+    print(f"arranque importación={resultado['importacion_s']['mediana_s']:.3f}s "
+          f"primer PDF={resultado['primer_pdf_s']['mediana_s']:.3f}s", file=sys.stderr)
+    return resultado
+
+
+# ===========================================
+# PDF
+# ===========================================
+def _informe(n_items, largo_nota, refs, solo_no):
+    from informe import Informe, ItemInforme
+    estados = ("yes", "no", "na", "none")
+    items = []
+    for i in range(n_items):
+        estado = estados[i % len(estados)]
+        items.append(ItemInforme(
+            titulo=f"Ítem {i}", referencia="Resolución 5109/2005 Art. 5",
+            estado=estado, nota=("Observación " * (largo_nota // 12 + 1))[:largo_nota],
+            evidencias=[], subchecks=[["Check", True], ["Check", False]] if i % 3 == 0 else [],
+        ))
+    # Las evidencias se reparten entre los ítems "no cumple"
+    con_no = [it for it in items if it.estado == "no"] or items
+    for k, ref in enumerate(refs):
+        con_no[k % len(con_no)].evidencias.append(ref)
+    return Informe(producto="Bench", proveedor="Bench", solo_no=solo_no, items=items)
+
+
+def bench_pdf(matriz: dict) -> tuple:
+    from imagenes import generar_variantes
+    from informe import generar_pdf
+    from evidencias import AlmacenEvidencias
+
+    variantes_res, pdf_res = [], []
+    dir_evidencias = tempfile.TemporaryDirectory(prefix="bench5109_ev_")
+    for ancho, alto in matriz["resoluciones"]:
+        # Presupuesto y cuota holgados: se mide el PDF, no los desalojos de la cache
+        almacen = AlmacenEvidencias(max_bytes=1 << 40, cuota=1 << 40,
+                                    directorio=os.path.join(dir_evidencias.name, f"{ancho}x{alto}"))
+        n_max = max(matriz["pdf_imagenes"])
+        tiempos = []
+        refs = []
+        for k in range(n_max):
+            original = _jpeg(ancho, alto)
+            t0 = time.perf_counter()
+            variantes = generar_variantes(original)
+            tiempos.append(time.perf_counter() - t0)
+            sha = almacen.agregar(original, 0, variantes)
+            refs.append({"sha": sha, "name": f"img{k}.jpg", "caption": ""})
+        if tiempos:
+            variantes_res.append({"resolucion": f"{ancho}x{alto}", **_resumen_tiempos(tiempos)})
+
+        def obtener(sha, tipo):
+            return almacen.obtener(sha) if tipo == "original" else almacen.variante(sha, tipo)
+
+        for n_items, largo, n_img, solo_no in itertools.product(
+            matriz["pdf_items"], matriz["pdf_notas"], matriz["pdf_imagenes"], matriz["solo_no"]
+        ):
+            informe = _informe(n_items, largo, refs[:n_img], solo_no)
+            tiempos = []
+            tamano = 0
+            for _ in range(matriz["repeticiones"]):
+                t0 = time.perf_counter()
+                buf = generar_pdf(informe, obtener)
+                tiempos.append(time.perf_counter() - t0)
+                tamano = buf.getbuffer().nbytes
+            tracemalloc.start()
+            generar_pdf(informe, obtener)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            pdf_res.append({
+                "items": n_items, "largo_nota": largo, "imagenes": n_img,
+                "resolucion": f"{ancho}x{alto}", "solo_no": solo_no,
+                "bytes_pdf": tamano, "pico_memoria_bytes": pico, **_resumen_tiempos(tiempos),
+            })
+            print(f"pdf    items={n_items:<4} nota={largo:<5} img={n_img:<3} {ancho}x{alto} solo_no={solo_no!s:<5} "
+                  f"{pdf_res[-1]['mediana_s']:.3f}s {pico / 1e6:.1f}MB", file=sys.stderr)
+    dir_evidencias.cleanup()
+    return variantes_res, pdf_res
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks headless del checklist 5109 (salida JSON).")
+    ap.add_argument("-o", "--salida", help="Archivo JSON de salida (por defecto: stdout)")
+    ap.add_argument("--rapido", action="store_true", help="Matriz reducida")
+    ap.add_argument("--sin-rerun", action="store_true", help="Omitir los reruns con AppTest")
+    ap.add_argument("--sin-pdf", action="store_true", help="Omitir el benchmark del PDF")
+    ap.add_argument("--sin-arranque", action="store_true", help="Omitir el benchmark de arranque")
+    ap.add_argument("--_rerun", nargs=3, type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args._rerun:
+        print(json.dumps(_medir_rerun(*args._rerun)))
+        return 0
+
+    matriz = MATRIZ_RAPIDA if args.rapido else MATRIZ_COMPLETA
+    resultado = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "matriz": "rapida" if args.rapido else "completa",
+        },
+    }
+    if not args.sin_arranque:
+        resultado["arranque"] = bench_arranque(matriz)
+    if not args.sin_rerun:
+        resultado["rerun"] = bench_rerun(matriz)
+    if not args.sin_pdf:
+        resultado["variantes"], resultado["pdf"] = bench_pdf(matriz)
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=1)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as fh:
+            fh.write(texto)
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+
+# checklist.py
+# Esquema del checklist como datos (checklists/*.json) compilado a un plan inmutable
+# - Se valida y compila una sola vez por proceso (cargar_plan usa lru_cache)
+# - Ítems con id corto y estable: claves de widgets, estado y base de datos usan el id
+# - Índices O(1): id → ítem, id → sub-checklist (mini checklist / anexo)
+# - Variantes (materia prima, otras resoluciones) = otro archivo JSON, sin tocar código
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from glob import glob
+from types import MappingProxyType
+
+DIR_CHECKLISTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checklists")
+PLAN_POR_DEFECTO = os.environ.get("CHECKLIST_5109_PLAN", os.path.join(DIR_CHECKLISTS, "res_5109_v5.json"))
+
+MODOS_SUB = ("lista", "expander", "anexo")
+MAX_CHECKS_SUB = 63   # bitset por ítem (estado.py) que cabe en un INTEGER con signo de SQLite
+_ID_VALIDO = re.compile(r"^[a-z0-9_]{1,32}$")
+
+
+class ChecklistInvalido(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Check:
+    id: str
+    texto: str
+
+
+@dataclass(frozen=True)
+class SubChecklist:
+    id: str
+    titulo: str
+    modo: str                      # "lista" / "expander" (casillas) o "anexo" (solo markdown)
+    checks: tuple = ()
+    markdown: tuple = ()
+
+
+@dataclass(frozen=True)
+class Item:
+    id: str
+    ordinal: int
+    titulo: str
+    que_verificar: str
+    referencia: str
+    aplica: str
+    sub: SubChecklist = None
+
+
+@dataclass(frozen=True)
+class Categoria:
+    id: str
+    titulo: str
+    items: tuple
+
+
+@dataclass(frozen=True)
+class PlanChecklist:
+    id: str
+    nombre: str
+    categorias: tuple
+    items: tuple                   # todos los ítems, en orden (items[i].ordinal == i)
+    por_id: MappingProxyType       # id de ítem → Item
+    por_titulo: MappingProxyType   # título → Item (compatibilidad con datos guardados por título)
+
+
+def _id(valor, donde: str) -> str:
+    if not isinstance(valor, str) or not _ID_VALIDO.match(valor):
+        raise ChecklistInvalido(f"{donde}: id inválido {valor!r} (use a-z, 0-9, _; máx. 32)")
+    return valor
+
+
+def _texto(d: dict, campo: str, donde: str) -> str:
+    valor = d.get(campo)
+    if not isinstance(valor, str):
+        raise ChecklistInvalido(f"{donde}: falta el campo de texto {campo!r}")
+    return valor
+
+
+def _compilar_sub(sid: str, d: dict) -> SubChecklist:
+    donde = f"subchecklists.{sid}"
+    modo = d.get("modo", "lista")
+    if modo not in MODOS_SUB:
+        raise ChecklistInvalido(f"{donde}: modo {modo!r} no es uno de {MODOS_SUB}")
+    checks, vistos = [], set()
+    for c in d.get("checks", []):
+        cid = _id(c.get("id"), f"{donde}.checks")
+        if cid in vistos:
+            raise ChecklistInvalido(f"{donde}: check duplicado {cid!r}")
+        vistos.add(cid)
+        checks.append(Check(cid, _texto(c, "texto", f"{donde}.{cid}")))
+    markdown = tuple(d.get("markdown", ()))
+    if modo == "anexo" and not markdown:
+        raise ChecklistInvalido(f"{donde}: un anexo necesita 'markdown'")
+    if modo != "anexo" and not checks:
+        raise ChecklistInvalido(f"{donde}: una lista necesita 'checks'")
+    if len(checks) > MAX_CHECKS_SUB:
+        raise ChecklistInvalido(f"{donde}: máximo {MAX_CHECKS_SUB} checks por sub-checklist")
+    return SubChecklist(_id(sid, donde), _texto(d, "titulo", donde), modo, tuple(checks), markdown)
+
+
+def compilar(datos: dict) -> PlanChecklist:
+    """Valida el JSON del checklist y lo compila a un PlanChecklist inmutable."""
+    subs = {sid: _compilar_sub(sid, d) for sid, d in datos.get("subchecklists", {}).items()}
+    categorias, items, por_id = [], [], {}
+    for c in datos.get("categorias", []):
+        cid = _id(c.get("id"), "categorias")
+        items_cat = []
+        for i in c.get("items", []):
+            donde = f"categorias.{cid}.items"
+            iid = _id(i.get("id"), donde)
+            if iid in por_id:
+                raise ChecklistInvalido(f"{donde}: ítem duplicado {iid!r}")
+            sub = None
+            if i.get("sub") is not None:
+                if i["sub"] not in subs:
+                    raise ChecklistInvalido(f"{donde}.{iid}: sub-checklist desconocido {i['sub']!r}")
+                sub = subs[i["sub"]]
+            item = Item(
+                id=iid, ordinal=len(items),
+                titulo=_texto(i, "titulo", f"{donde}.{iid}"),
+                que_verificar=_texto(i, "que_verificar", f"{donde}.{iid}"),
+                referencia=_texto(i, "referencia", f"{donde}.{iid}"),
+                aplica=_texto(i, "aplica", f"{donde}.{iid}"),
+                sub=sub,
+            )
+            por_id[iid] = item
+            items.append(item)
+            items_cat.append(item)
+        categorias.append(Categoria(cid, _texto(c, "titulo", f"categorias.{cid}"), tuple(items_cat)))
+    if not items:
+        raise ChecklistInvalido("el checklist no tiene ítems")
+    return PlanChecklist(
+        id=_id(datos.get("id"), "id"),
+        nombre=_texto(datos, "nombre", "raíz"),
+        categorias=tuple(categorias),
+        items=tuple(items),
+        por_id=MappingProxyType(por_id),
+        por_titulo=MappingProxyType({it.titulo: it for it in items}),
+    )
+
+
+@lru_cache(maxsize=None)
+def cargar_plan(ruta: str = PLAN_POR_DEFECTO) -> PlanChecklist:
+    with open(ruta, encoding="utf-8") as fh:
+        return compilar(json.load(fh))
+
+
+def planes_disponibles() -> dict:
+    """{nombre de archivo: ruta} de los checklists en DIR_CHECKLISTS, más PLAN_POR_DEFECTO si está fuera."""
+    planes = {os.path.basename(r): r for r in sorted(glob(os.path.join(DIR_CHECKLISTS, "*.json")))}
+    if os.path.abspath(PLAN_POR_DEFECTO) not in map(os.path.abspath, planes.values()):
+        nombre = os.path.basename(PLAN_POR_DEFECTO)
+        planes[nombre if nombre not in planes else PLAN_POR_DEFECTO] = PLAN_POR_DEFECTO
+    return planes
+
+
+def archivo_por_defecto(planes: dict) -> str:
+    """Nombre con el que PLAN_POR_DEFECTO aparece en `planes` (ver planes_disponibles)."""
+    destino = os.path.abspath(PLAN_POR_DEFECTO)
+    return next(a for a, r in planes.items() if os.path.abspath(r) == destino)
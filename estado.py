@@ -0,0 +1,195 @@
+
+# estado.py
+# Estado compacto de respuestas de una verificación, indexado por ordinal de ítem del plan
+# - estados: bytearray, 1 byte por ítem (0 sin responder, 1 cumple, 2 no cumple, 3 no aplica)
+# - subchecks: array('Q'), un bitset de 64 bits por ítem (bit i = check i del mini checklist);
+#   solo se usan 63 bits para que el valor quepa en un INTEGER de SQLite (con signo)
+# - notas: lista de str por ítem
+# - Instantánea binaria (a_bytes/desde_bytes) y JSON (a_dict/desde_dict), y diff entre estados
+# - desde_instantanea(datos): cualquiera de los dos formatos, con las mismas validaciones
+#   (la usan la restauración en la app y la importación masiva, importar_respuestas.py)
+# - La JSON puede llevar además el encabezado de la verificación ({campo: texto o bool}):
+#   leer_instantanea(datos) devuelve (estado, encabezado), {} si no lo trae o es binaria
+
+import json
+import struct
+import sys
+from array import array
+
+ESTADOS = ("none", "yes", "no", "na")
+CODIGOS = {e: i for i, e in enumerate(ESTADOS)}
+
+MAGIA = b"E509"
+VERSION = 1
+_CABECERA = struct.Struct("<4sBHH")   # magia, versión, largo del id del plan, n.º de ítems
+_LARGO = struct.Struct("<I")
+MAX_CHECKS = 63
+MAX_SUBCHECKS = (1 << MAX_CHECKS) - 1
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class InstantaneaInvalida(ValueError):
+    pass
+
+
+class EstadoRespuestas:
+    __slots__ = ("plan_id", "estados", "subchecks", "notas")
+
+    def __init__(self, plan_id: str, n_items: int):
+        self.plan_id = plan_id
+        self.estados = bytearray(n_items)
+        self.subchecks = array("Q", bytes(8 * n_items))
+        self.notas = [""] * n_items
+
+    @classmethod
+    def para_plan(cls, plan) -> "EstadoRespuestas":
+        return cls(plan.id, len(plan.items))
+
+    def __len__(self) -> int:
+        return len(self.estados)
+
+    # ---------- acceso ----------
+    def estado(self, ordinal: int) -> str:
+        return ESTADOS[self.estados[ordinal]]
+
+    def fijar_estado(self, ordinal: int, estado: str) -> None:
+        self.estados[ordinal] = CODIGOS[estado]
+
+    def check(self, ordinal: int, bit: int) -> bool:
+        return bool(self.subchecks[ordinal] >> bit & 1)
+
+    def fijar_check(self, ordinal: int, bit: int, valor: bool) -> None:
+        if not 0 <= bit < MAX_CHECKS:
+            raise IndexError(f"check {bit} fuera del bitset de {MAX_CHECKS}")
+        if valor:
+            self.subchecks[ordinal] |= 1 << bit
+        else:
+            self.subchecks[ordinal] &= ~(1 << bit) & 0xFFFFFFFFFFFFFFFF
+
+    def conteo(self) -> dict:
+        """{"yes", "no", "na", "none"} contados en C sobre el bytearray."""
+        return {e: self.estados.count(c) for e, c in CODIGOS.items()}
+
+    # ---------- comparación ----------
+    def diff(self, otro: "EstadoRespuestas") -> list:
+        """Ordinales cuyo estado, subchecks o nota difieren entre ambos."""
+        if len(otro) != len(self) or otro.plan_id != self.plan_id:
+            raise InstantaneaInvalida("no se pueden comparar estados de planes distintos")
+        return [
+            i for i in range(len(self))
+            if self.estados[i] != otro.estados[i]
+            or self.subchecks[i] != otro.subchecks[i]
+            or self.notas[i] != otro.notas[i]
+        ]
+
+    # ---------- instantánea binaria ----------
+    def a_bytes(self) -> bytes:
+        plan = self.plan_id.encode("utf-8")
+        sub = array("Q", self.subchecks)
+        if _BIG_ENDIAN:
+            sub.byteswap()
+        partes = [_CABECERA.pack(MAGIA, VERSION, len(plan), len(self)), plan, bytes(self.estados), sub.tobytes()]
+        for nota in self.notas:
+            datos = nota.encode("utf-8")
+            partes.append(_LARGO.pack(len(datos)))
+            partes.append(datos)
+        return b"".join(partes)
+
+    @classmethod
+    def desde_bytes(cls, datos) -> "EstadoRespuestas":
+        vista = memoryview(datos)
+        try:
+            magia, version, largo_plan, n = _CABECERA.unpack_from(vista, 0)
+        except struct.error as e:
+            raise InstantaneaInvalida(f"instantánea truncada: {e}") from None
+        if magia != MAGIA or version != VERSION:
+            raise InstantaneaInvalida("no es una instantánea de verificación 5109 compatible")
+        pos = _CABECERA.size
+        try:
+            plan_id = bytes(vista[pos:pos + largo_plan]).decode("utf-8")
+            pos += largo_plan
+            nuevo = cls(plan_id, 0)
+            nuevo.estados = bytearray(vista[pos:pos + n])
+            pos += n
+            nuevo.subchecks = array("Q", bytes(vista[pos:pos + 8 * n]))
+            if _BIG_ENDIAN:
+                nuevo.subchecks.byteswap()
+            pos += 8 * n
+            notas = []
+            for _ in range(n):
+                (largo,) = _LARGO.unpack_from(vista, pos)
+                pos += _LARGO.size
+                notas.append(bytes(vista[pos:pos + largo]).decode("utf-8"))
+                pos += largo
+            nuevo.notas = notas
+        except (struct.error, ValueError) as e:
+            raise InstantaneaInvalida(f"instantánea dañada: {e}") from None
+        if len(nuevo.estados) != n or len(nuevo.subchecks) != n or max(nuevo.estados, default=0) >= len(ESTADOS):
+            raise InstantaneaInvalida("instantánea dañada: estados inválidos")
+        if max(nuevo.subchecks, default=0) > MAX_SUBCHECKS:
+            raise InstantaneaInvalida("instantánea dañada: subchecks inválidos")
+        if pos != len(vista):
+            raise InstantaneaInvalida(f"instantánea dañada: {len(vista) - pos} bytes de más al final")
+        return nuevo
+
+    # ---------- instantánea JSON ----------
+    def a_dict(self, encabezado: dict = None) -> dict:
+        d = {
+            "plan": self.plan_id,
+            "estados": "".join(str(c) for c in self.estados),
+            "subchecks": self.subchecks.tolist(),
+            "notas": {str(i): n for i, n in enumerate(self.notas) if n},
+        }
+        if encabezado:
+            d["encabezado"] = dict(encabezado)
+        return d
+
+    @classmethod
+    def desde_dict(cls, d) -> "EstadoRespuestas":
+        if not isinstance(d, dict) or not isinstance(d.get("plan"), str) or not isinstance(d.get("estados"), str):
+            raise InstantaneaInvalida("no es una instantánea JSON de verificación 5109")
+        estados = d["estados"]
+        n = len(estados)
+        if n > 0xFFFF or any(c not in "0123" for c in estados):
+            raise InstantaneaInvalida("instantánea dañada: estados inválidos")
+        subchecks = d.get("subchecks") or [0] * n
+        if (not isinstance(subchecks, list) or len(subchecks) != n
+                or any(type(b) is not int or not 0 <= b <= MAX_SUBCHECKS for b in subchecks)):
+            raise InstantaneaInvalida("instantánea dañada: subchecks inválidos")
+        notas = d.get("notas", {})
+        if not isinstance(notas, dict):
+            raise InstantaneaInvalida("instantánea dañada: notas inválidas")
+        nuevo = cls(d["plan"], n)
+        nuevo.estados = bytearray(int(c) for c in estados)
+        nuevo.subchecks = array("Q", subchecks)
+        for i, nota in notas.items():
+            if not (isinstance(i, str) and i.isascii() and i.isdigit() and int(i) < n and isinstance(nota, str)):
+                raise InstantaneaInvalida(f"instantánea dañada: nota {i!r} inválida")
+            nuevo.notas[int(i)] = nota
+        return nuevo
+
+
+def _encabezado(d: dict) -> dict:
+    encabezado = d.get("encabezado", {})
+    if not isinstance(encabezado, dict) or any(
+        not isinstance(k, str) or not isinstance(v, (str, bool)) for k, v in encabezado.items()
+    ):
+        raise InstantaneaInvalida("instantánea dañada: encabezado inválido")
+    return encabezado
+
+
+def leer_instantanea(datos: bytes) -> tuple:
+    """(EstadoRespuestas, encabezado) de una instantánea binaria (.e509) o JSON, según su contenido."""
+    if bytes(datos[:len(MAGIA)]) == MAGIA:
+        return EstadoRespuestas.desde_bytes(datos), {}
+    try:
+        d = json.loads(bytes(datos).decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise InstantaneaInvalida(f"no es una instantánea .e509 ni JSON ({e})") from None
+    estado = EstadoRespuestas.desde_dict(d)
+    return estado, _encabezado(d)
+
+
+def desde_instantanea(datos: bytes) -> EstadoRespuestas:
+    """Instantánea binaria (.e509) o JSON, según su contenido."""
+    return leer_instantanea(datos)[0]
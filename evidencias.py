@@ -0,0 +1,235 @@
+# evidencias.py
+# Almacén de evidencias fotográficas direccionado por contenido (SHA-256), compartido por el proceso
+# - Uno por proceso (la app lo guarda con st.cache_resource): todas las sesiones y los hilos
+#   del PDF leen de la misma cache; cada ítem solo guarda referencias {"sha", "name", "caption"}
+# - Memoria: LRU de (sha, tipo) → bytes acotada por MAX_BYTES_MEMORIA; tipo es "original",
+#   "mini" (grilla de la UI) o "impresion" (PDF)
+# - Disco: cada blob agregado se escribe una vez en DIR_DERRAME/<sha[:2]>/<sha>.<tipo>, así un
+#   desalojo solo suelta memoria (sin E/S bajo el lock) y la relectura es transparente
+# - Respaldo: si el blob no está en memoria ni en disco se pide a `respaldo(sha, tipo)`
+#   (la app lee la base SQLite); lo recargado solo vuelve a la memoria
+# - Cuotas por verificación (su id en la base, no la sesión del navegador: un refresco no
+#   renueva la cuota): cada una puede agregar hasta `cuota` bytes, contando lo que ya tiene
+#   guardado (`uso_inicial(verificacion)` → (shas, bytes), la app lo lee de SQLite)
+# - Las verificaciones sin actividad por más de `ttl_inactividad` se olvidan (la cuota se vuelve
+#   a leer de la base) y sus blobs que ninguna otra verificación agregó se borran del disco
+# - Se entregan los mismos objetos bytes (inmutables) a la UI y al PDF:
+#   st.image() y BytesIO() los usan sin copiarlos ni decodificarlos
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+MAX_BYTES_MEMORIA = int(os.environ.get("CHECKLIST_5109_CACHE_MB", "512")) * 1024 * 1024
+CUOTA_VERIFICACION = int(os.environ.get("CHECKLIST_5109_CUOTA_MB", "300")) * 1024 * 1024
+DIR_DERRAME       = os.environ.get("CHECKLIST_5109_DIR_EVIDENCIAS",
+                                   os.path.join(tempfile.gettempdir(), "evidencias_5109"))
+TTL_INACTIVIDAD   = 30 * 60
+TIPOS             = ("original", "mini", "impresion")
+
+
+def huella_contenido(datos) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+class CuotaExcedida(Exception):
+    pass
+
+
+class AlmacenEvidencias:
+    def __init__(self, max_bytes: int = MAX_BYTES_MEMORIA, directorio: str = DIR_DERRAME,
+                 cuota: int = CUOTA_VERIFICACION, ttl_inactividad: float = TTL_INACTIVIDAD,
+                 respaldo=None, uso_inicial=None):
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict()   # (sha, tipo) -> bytes, del menos al más reciente
+        self._bytes = 0
+        self._max_bytes = max_bytes
+        self._dir = directorio
+        self._cuota = cuota
+        self._ttl = ttl_inactividad
+        self._respaldo = respaldo
+        self._uso_inicial = uso_inicial
+        self._en_disco = {}             # sha -> {tipo: tamaño} escritos en el directorio
+        self._duenos = {}               # sha -> n.º de verificaciones que lo agregaron
+        self._cuentas = {}              # verificacion -> {"shas": set, "bytes": int, "visto": monotonic}
+        self.aciertos = self.fallos = self.desalojos = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    # ---------- disco ----------
+    def _ruta(self, sha: str, tipo: str) -> str:
+        return os.path.join(self._dir, sha[:2], f"{sha}.{tipo}")
+
+    def _escribir_disco(self, sha: str, tipo: str, datos) -> None:
+        ruta = self._ruta(sha, tipo)
+        if os.path.exists(ruta):
+            return
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(datos)
+        os.replace(tmp, ruta)
+
+    def _borrar_disco(self, sha: str) -> None:
+        for tipo in TIPOS:
+            try:
+                os.remove(self._ruta(sha, tipo))
+            except FileNotFoundError:
+                pass
+
+    # ---------- memoria (llamar con el lock tomado) ----------
+    def _poner(self, sha: str, tipo: str, datos: bytes) -> None:
+        clave = (sha, tipo)
+        if clave in self._memoria:
+            self._memoria.move_to_end(clave)
+            return
+        self._memoria[clave] = datos
+        self._bytes += len(datos)
+        while self._bytes > self._max_bytes and len(self._memoria) > 1:
+            _, viejo = self._memoria.popitem(last=False)
+            self._bytes -= len(viejo)
+            self.desalojos += 1
+
+    def _quitar(self, sha: str) -> None:
+        for tipo in TIPOS:
+            datos = self._memoria.pop((sha, tipo), None)
+            if datos is not None:
+                self._bytes -= len(datos)
+
+    # ---------- verificaciones ----------
+    def tocar(self, verificacion) -> None:
+        """Marca la verificación como activa y olvida las que llevan más de `ttl_inactividad` sin uso."""
+        self._asegurar_cuenta(verificacion)
+        ahora = time.monotonic()
+        huerfanos = []
+        with self._lock:
+            self._cuenta(verificacion, ahora)
+            for v, datos in list(self._cuentas.items()):
+                if ahora - datos["visto"] > self._ttl:
+                    del self._cuentas[v]
+                    for sha in datos["shas"]:
+                        n = self._duenos.get(sha, 0) - 1
+                        if n > 0:
+                            self._duenos[sha] = n
+                        else:
+                            self._duenos.pop(sha, None)
+                            self._en_disco.pop(sha, None)
+                            self._quitar(sha)
+                            huerfanos.append(sha)
+        # Siguen en la base (respaldo) si alguien los vuelve a pedir
+        for sha in huerfanos:
+            self._borrar_disco(sha)
+
+    def _asegurar_cuenta(self, verificacion) -> None:
+        # El uso ya guardado se lee fuera del lock (es una consulta a la base)
+        with self._lock:
+            if verificacion in self._cuentas:
+                return
+        shas, usados = self._uso_inicial(verificacion) if self._uso_inicial is not None else ((), 0)
+        with self._lock:
+            if verificacion in self._cuentas:
+                return
+            self._cuentas[verificacion] = {"shas": set(shas), "bytes": usados, "visto": time.monotonic()}
+            for sha in shas:
+                self._duenos[sha] = self._duenos.get(sha, 0) + 1
+
+    def _cuenta(self, verificacion, ahora: float) -> dict:
+        datos = self._cuentas.get(verificacion)
+        if datos is None:
+            datos = self._cuentas[verificacion] = {"shas": set(), "bytes": 0, "visto": ahora}
+        datos["visto"] = ahora
+        return datos
+
+    def uso(self, verificacion) -> int:
+        with self._lock:
+            datos = self._cuentas.get(verificacion)
+            return datos["bytes"] if datos else 0
+
+    # ---------- escritura ----------
+    def agregar(self, datos, verificacion, variantes: dict = None, sha: str = None) -> str:
+        """Guarda `datos` (y sus variantes) a nombre de `verificacion` y devuelve su SHA-256.
+
+        `sha` evita volver a hashear lo que ya hasheó la ingesta. Lanza CuotaExcedida si la
+        verificación superaría su cuota; un sha que ya tiene no vuelve a contar.
+        """
+        sha = sha or huella_contenido(datos)
+        datos = bytes(datos)
+        blobs = {"original": datos, **(variantes or {})}
+        tam = sum(len(b) for b in blobs.values())
+        self._asegurar_cuenta(verificacion)
+        with self._lock:
+            c = self._cuenta(verificacion, time.monotonic())
+            nuevo = sha not in c["shas"]
+            if nuevo and c["bytes"] + tam > self._cuota:
+                raise CuotaExcedida(
+                    f"la verificación alcanzó su cuota de {self._cuota // (1024 * 1024)} MB de evidencias"
+                )
+            if nuevo:
+                c["shas"].add(sha)
+                c["bytes"] += tam
+                self._duenos[sha] = self._duenos.get(sha, 0) + 1
+        # E/S de disco fuera del lock: el mismo contenido siempre produce el mismo archivo
+        for tipo, b in blobs.items():
+            self._escribir_disco(sha, tipo, b)
+        with self._lock:
+            en_disco = self._en_disco.setdefault(sha, {})
+            for tipo, b in blobs.items():
+                en_disco[tipo] = len(b)
+                self._poner(sha, tipo, b)
+        return sha
+
+    # ---------- lectura ----------
+    def _leer(self, sha: str, tipo: str, cachear: bool = True):
+        with self._lock:
+            datos = self._memoria.get((sha, tipo))
+            if datos is not None:
+                self._memoria.move_to_end((sha, tipo))
+                self.aciertos += 1
+                return datos
+            self.fallos += 1
+        try:
+            with open(self._ruta(sha, tipo), "rb") as fh:
+                datos = fh.read()
+        except FileNotFoundError:
+            datos = self._respaldo(sha, tipo) if self._respaldo is not None else None
+            if datos is None:
+                return None
+        if cachear:
+            with self._lock:
+                self._poner(sha, tipo, datos)
+        return datos
+
+    def obtener(self, sha: str, cachear: bool = True) -> bytes:
+        """Original del sha; con `cachear=False` (exportaciones masivas) no desplaza a la LRU."""
+        datos = self._leer(sha, "original", cachear)
+        if datos is None:
+            raise KeyError(sha)
+        return datos
+
+    def variante(self, sha: str, tipo: str, cachear: bool = True) -> bytes:
+        """Variante reducida (`"mini"` / `"impresion"`); si no existe, el original."""
+        datos = self._leer(sha, tipo, cachear)
+        return datos if datos is not None else self.obtener(sha, cachear)
+
+    def __contains__(self, sha) -> bool:
+        with self._lock:
+            return sha in self._en_disco
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._en_disco)
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes en memoria (la parte derramada a disco no cuenta)."""
+        return self._bytes
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "memoria_bytes": self._bytes, "entradas_memoria": len(self._memoria),
+                "blobs_disco": len(self._en_disco), "verificaciones": len(self._cuentas),
+                "aciertos": self.aciertos, "fallos": self.fallos, "desalojos": self.desalojos,
+            }
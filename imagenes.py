@@ -0,0 +1,58 @@
+
+# imagenes.py
+# Reducción y recompresión de evidencias al momento de cargarlas
+# - Aplica la orientación EXIF (fotos de celular giradas)
+# - "mini": miniatura JPEG para la grilla de la UI
+# - "impresion": JPEG ajustado al recuadro de 85×55 mm del PDF a resolución de impresión
+# - El original no se toca (queda disponible para el anexo en resolución completa)
+
+from io import BytesIO
+from PIL import Image, ImageOps
+
+MM_POR_PULGADA = 25.4
+
+MINI_LADO_PX   = 480
+MINI_CALIDAD   = 75
+
+CAJA_PDF_MM       = (85, 55)
+DPI_IMPRESION     = 300
+IMPRESION_CALIDAD = 82
+
+
+def _px_caja(caja_mm, dpi):
+    return tuple(int(round(lado / MM_POR_PULGADA * dpi)) for lado in caja_mm)
+
+
+def _a_rgb(img):
+    # JPEG no admite transparencia: se aplana sobre fondo blanco
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel("A"))
+        return fondo
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _jpeg(img, calidad) -> bytes:
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=calidad, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def generar_variantes(datos: bytes) -> dict:
+    """Devuelve {"mini": bytes, "impresion": bytes} a partir de la imagen original."""
+    with Image.open(BytesIO(datos)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = _a_rgb(img)
+
+        impresion = img.copy()
+        # Image.thumbnail solo reduce (nunca amplía) y conserva la proporción
+        impresion.thumbnail(_px_caja(CAJA_PDF_MM, DPI_IMPRESION), Image.LANCZOS)
+
+        mini = impresion.copy()
+        mini.thumbnail((MINI_LADO_PX, MINI_LADO_PX), Image.LANCZOS)
+
+        return {
+            "mini": _jpeg(mini, MINI_CALIDAD),
+            "impresion": _jpeg(impresion, IMPRESION_CALIDAD),
+        }
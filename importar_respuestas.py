@@ -0,0 +1,119 @@
+
+# importar_respuestas.py
+# Importación masiva de instantáneas de respuestas a la base de verificaciones
+#   python importar_respuestas.py ENTRADA [ENTRADA ...] [--db RUTA] [--encabezados CSV]
+# - ENTRADA: instantáneas (.e509 binarias o .json, ver estado.py) o directorios que las contengan
+# - Cada instantánea se valida igual que al restaurarla en la app y contra su plan
+#   (mismo id y n.º de ítems, ver checklist.py); luego queda como una verificación nueva
+# - Encabezado (producto, proveedor, fecha…): el que trae la instantánea JSON descargada de la
+#   app y, encima, la fila de --encabezados cuya columna "archivo" es el nombre de la instantánea
+#   (las .e509 no lo traen); sin él la verificación no aparece en la búsqueda ni en la analítica
+# - Todas se escriben en una sola transacción (executemany por verificación)
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+from checklist import cargar_plan, planes_disponibles
+from estado import InstantaneaInvalida, leer_instantanea
+from persistencia import AlmacenVerificaciones, CAMPOS_ENCABEZADO, RUTA_DB
+
+EXTENSIONES = (".e509", ".json")
+
+
+def _buscar_instantaneas(entradas):
+    for entrada in entradas:
+        if os.path.isfile(entrada):
+            yield entrada
+            continue
+        for raiz, _, archivos in os.walk(entrada):
+            for a in sorted(archivos):
+                if a.endswith(EXTENSIONES):
+                    yield os.path.join(raiz, a)
+
+
+def _leer_encabezados(ruta: str) -> dict:
+    """{nombre de archivo: {campo: valor}} del CSV de encabezados (columna "archivo" + CAMPOS_ENCABEZADO)."""
+    with open(ruta, newline="", encoding="utf-8-sig") as fh:
+        filas = list(csv.DictReader(fh))
+    if filas and "archivo" not in filas[0]:
+        raise ValueError(f"{ruta}: falta la columna 'archivo'")
+    return {
+        f["archivo"].strip(): {c: (f[c] or "").strip() for c in CAMPOS_ENCABEZADO if c in f}
+        for f in filas
+    }
+
+
+def _normalizar_encabezado(encabezado: dict) -> dict:
+    normal = {c: encabezado[c] for c in CAMPOS_ENCABEZADO if c in encabezado}
+    activo = normal.get("invima_estado_activo", False)
+    if isinstance(activo, str):
+        activo = activo.strip().lower() in ("1", "si", "sí", "true", "x")
+    normal["invima_estado_activo"] = activo
+    return normal
+
+
+def _filas(plan, estado) -> list:
+    """[(item, estado, nota, subchecks)] de los ítems con algo respondido."""
+    return [
+        (it.id, estado.estado(it.ordinal), estado.notas[it.ordinal], estado.subchecks[it.ordinal])
+        for it in plan.items
+        if estado.estados[it.ordinal] or estado.notas[it.ordinal] or estado.subchecks[it.ordinal]
+    ]
+
+
+def _leer(ruta: str, planes: dict):
+    with open(ruta, "rb") as fh:
+        estado, encabezado = leer_instantanea(fh.read())
+    plan = planes.get(estado.plan_id)
+    if plan is None:
+        raise InstantaneaInvalida(f"plan desconocido {estado.plan_id!r}")
+    if len(estado) != len(plan.items):
+        raise InstantaneaInvalida(f"tiene {len(estado)} ítems y el plan {plan.id!r} {len(plan.items)}")
+    return plan.id, encabezado, _filas(plan, estado)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Importa en bloque instantáneas de respuestas 5109 a la base.")
+    ap.add_argument("entradas", nargs="+", help="Instantáneas (.e509 / .json) o directorios que las contengan")
+    ap.add_argument("--db", default=RUTA_DB, help=f"Base de verificaciones (por defecto: {RUTA_DB})")
+    ap.add_argument("--encabezados", metavar="CSV",
+                    help=f"Encabezado por instantánea: columnas archivo, {', '.join(CAMPOS_ENCABEZADO)}")
+    args = ap.parse_args(argv)
+    try:
+        encabezados = _leer_encabezados(args.encabezados) if args.encabezados else {}
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"ERROR {e}", file=sys.stderr)
+        return 1
+
+    rutas = list(_buscar_instantaneas(args.entradas))
+    if not rutas:
+        print(f"No se encontraron instantáneas ({', '.join(EXTENSIONES)})", file=sys.stderr)
+        return 1
+    planes = {p.id: p for p in map(cargar_plan, planes_disponibles().values())}
+    planes.setdefault(cargar_plan().id, cargar_plan())
+
+    t0 = time.perf_counter()
+    validas, errores = [], 0
+    for ruta in rutas:
+        try:
+            plan_id, encabezado, filas = _leer(ruta, planes)
+        except (OSError, InstantaneaInvalida) as e:
+            errores += 1
+            print(f"ERROR {ruta}: {e}", file=sys.stderr)
+            continue
+        encabezado = _normalizar_encabezado({**encabezado, **encabezados.get(os.path.basename(ruta), {})})
+        validas.append((ruta, encabezado, plan_id, filas))
+
+    ids = AlmacenVerificaciones(args.db).importar(((e, plan_id, filas) for _, e, plan_id, filas in validas))
+    for (ruta, encabezado, _, _), verif_id in zip(validas, ids):
+        aviso = "" if encabezado.get("producto") else " (sin producto en el encabezado)"
+        print(f"OK    {ruta} → #{verif_id}{aviso}")
+    print(f"{len(ids)}/{len(rutas)} instantáneas importadas en {time.perf_counter() - t0:.1f} s")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+
+# informe.py
+# Motor de informes PDF independiente de Streamlit
+# - Informe: objeto serializable (encabezado, estados, notas, referencias de evidencia)
+# - generar_pdf(informe, obtener_imagen): PDF horizontal con portada (v5) + evidencias
+# - generar_pdf_spool(...): igual, pero escribe en un archivo temporal "spooled"
+#   (en memoria si es pequeño, en disco si crece) para acotar la memoria pico
+# - Las imágenes se leen recién cuando su flowable se dibuja (ImagenDiferida)
+# - ReportLab se importa con el primer PDF (_recursos_pdf): importar este módulo no lo carga,
+#   y estilos, TableStyle y clases de flowables se construyen una sola vez por proceso
+# - huella(informe): SHA-256 del contenido del informe (para memoizar el PDF)
+# - Fases medidas en metricas.REGISTRO ("pdf_fase"): historia, evidencias, build y,
+#   dentro de build, tabla (maquetado: wrap/split) e imagenes (cada drawImage)
+# - Las imágenes se piden por sha a `obtener_imagen(sha, tipo)` con tipo "impresion" u "original"
+# - Formato en disco de una verificación guardada:
+#     <nombre>.json          → Informe.a_dict()
+#     evidencias/<sha>       → original
+#     evidencias/<sha>.impresion.jpg → variante para el PDF (opcional)
+# - empaquetar_zip(...): ese formato en un ZIP "spooled", como generar_pdf_spool
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass, field, asdict
+from io import BytesIO
+from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+
+from metricas import medir
+
+ESTADOS_HUMANOS = {"yes": "Cumple", "no": "No cumple", "na": "No aplica"}
+DIR_EVIDENCIAS = "evidencias"
+SUFIJO_IMPRESION = ".impresion.jpg"
+MAX_PDF_EN_MEMORIA = 8 * 1024 * 1024
+
+
+@dataclass
+class ItemInforme:
+    titulo: str
+    referencia: str = ""
+    estado: str = "none"      # "yes" / "no" / "na" / "none"
+    nota: str = ""
+    evidencias: list = field(default_factory=list)   # [{"sha", "name", "caption"}]
+    subchecks: list = field(default_factory=list)    # [[texto, cumple: bool]] del mini checklist
+
+
+@dataclass
+class Informe:
+    producto: str = ""
+    proveedor: str = ""
+    responsable: str = ""
+    fecha_verif: str = ""
+    invima_registro: str = ""
+    invima_estado_activo: bool = False
+    invima_url: str = ""
+    solo_no: bool = False
+    anexo_completo: bool = False
+    items: list = field(default_factory=list)         # [ItemInforme]
+
+    def a_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def desde_dict(cls, d: dict) -> "Informe":
+        d = dict(d)
+        items = [ItemInforme(**i) for i in d.pop("items", [])]
+        return cls(**d, items=items)
+
+    def resumen(self) -> dict:
+        conteo = {"yes": 0, "no": 0, "na": 0, "none": 0}
+        for it in self.items:
+            conteo[it.estado if it.estado in conteo else "none"] += 1
+        contestados = conteo["yes"] + conteo["no"]
+        conteo["percent"] = round((conteo["yes"] / contestados * 100), 1) if contestados > 0 else 0.0
+        return conteo
+
+
+def huella(informe: Informe) -> str:
+    """Identifica el contenido del informe: encabezado, estados, notas, evidencias (sha) y filtros."""
+    canon = json.dumps(informe.a_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+def _wrap(text: str, chunk: int = 110) -> str:
+    if not text:
+        return ""
+    s = str(text)
+    return "\\n".join([s[i:i+chunk] for i in range(0, len(s), chunk)])
+
+
+# ===========================================
+# PDF (horizontal) — portada (v5) + evidencias
+# ===========================================
+@lru_cache(maxsize=None)
+def _recursos_pdf() -> SimpleNamespace:
+    """Importa ReportLab y arma lo reutilizable entre PDFs (una vez por proceso).
+
+    Los estilos y el TableStyle solo se leen durante doc.build(): se comparten entre hilos.
+    """
+    with medir("pdf_fase", fase="carga_reportlab"):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.lib.units import mm
+        from reportlab.lib.utils import ImageReader
+        from reportlab.platypus import (
+            Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle,
+        )
+
+        class ImagenDiferida(Flowable):
+            """Imagen cuyos bytes se piden a `obtener_imagen` solo al dibujarla (proporcional, dentro de width × height)."""
+
+            def __init__(self, obtener_imagen, sha, tipo, width, height, nombre=""):
+                super().__init__()
+                self.obtener_imagen = obtener_imagen
+                self.sha = sha
+                self.tipo = tipo
+                self.width = width
+                self.height = height
+                self.nombre = nombre
+
+            def wrap(self, availWidth, availHeight):
+                return self.width, self.height
+
+            def draw(self):
+                try:
+                    with medir("pdf_fase", fase="imagenes"):
+                        imagen = ImageReader(BytesIO(self.obtener_imagen(self.sha, self.tipo)))
+                        self.canv.drawImage(imagen, 0, 0, self.width, self.height,
+                                            preserveAspectRatio=True, anchor="nw")
+                except Exception as e:
+                    self.canv.setFont("Helvetica-Oblique", 8)
+                    self.canv.drawString(0, self.height - 10, f"Error al cargar imagen {self.nombre}: {e}")
+
+        class TablaMedida(Table):
+            """Table que mide su maquetado (ReportLab lo hace dentro de doc.build())."""
+
+            def wrap(self, availWidth, availHeight):
+                with medir("pdf_fase", fase="tabla"):
+                    return super().wrap(availWidth, availHeight)
+
+            def split(self, availWidth, availHeight):
+                with medir("pdf_fase", fase="tabla"):
+                    return super().split(availWidth, availHeight)
+
+        styles = getSampleStyleSheet()
+        return SimpleNamespace(
+            mm=mm,
+            pagina=landscape(A4),
+            SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer, PageBreak=PageBreak,
+            ImagenDiferida=ImagenDiferida, Tabla=TablaMedida,
+            style_header=ParagraphStyle("header", parent=styles["Normal"], fontSize=9, leading=11),
+            style_cell=ParagraphStyle("cell", parent=styles["Normal"], fontSize=8, leading=10),
+            estilo_tabla=TableStyle([
+                ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#f2f2f2")),
+                ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+                ("FONTSIZE", (0,0), (-1,0), 9),
+                ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+                ("VALIGN", (0,0), (-1,-1), "TOP"),
+                ("LEFTPADDING",(0,0), (-1,-1), 3),
+                ("RIGHTPADDING",(0,0), (-1,-1), 3),
+            ]),
+        )
+
+
+def _avisar_progreso(doc, progreso):
+    # ReportLab informa 'SIZE_EST' (n.º de flowables) y luego 'PROGRESS' (flowables procesados)
+    total = [1]
+
+    def callback(tipo, valor):
+        if tipo == "SIZE_EST":
+            total[0] = max(int(valor), 1)
+        elif tipo == "PROGRESS":
+            progreso(min(valor / total[0], 1.0), "Maquetando PDF")
+        elif tipo == "FINISHED":
+            progreso(1.0, "PDF listo")
+
+    doc.setProgressCallBack(callback)
+
+
+def generar_pdf(informe: Informe, obtener_imagen, progreso=None, destino=None):
+    """Escribe el PDF en `destino` (archivo binario abierto) o, si no se da, en un BytesIO.
+
+    `progreso(fraccion, mensaje)` opcional, llamado durante doc.build().
+    """
+    r = _recursos_pdf()
+    mm, Paragraph, Spacer, PageBreak = r.mm, r.Paragraph, r.Spacer, r.PageBreak
+    style_header, style_cell = r.style_header, r.style_cell
+
+    buf = destino if destino is not None else BytesIO()
+    doc = r.SimpleDocTemplate(
+        buf,
+        pagesize=r.pagina,
+        leftMargin=8*mm, rightMargin=8*mm,
+        topMargin=8*mm, bottomMargin=8*mm
+    )
+    if progreso is not None:
+        _avisar_progreso(doc, progreso)
+
+    with medir("pdf_fase", fase="historia"):
+        percent = informe.resumen()["percent"]
+
+        story = []
+        # Portada v5
+        fecha_str = informe.fecha_verif or datetime.now().strftime("%Y-%m-%d")
+        portada = (
+            f"<b>Informe de verificación — Rotulado general (Res. 5109/2005 v5)</b><br/>"
+            f"<b>Fecha:</b> {fecha_str} &nbsp;&nbsp; "
+            f"<b>Producto:</b> {informe.producto or '-'} &nbsp;&nbsp; "
+            f"<b>Responsable:</b> {informe.responsable or '-'}<br/>"
+            f"<b>Fabricante/Importador:</b> {informe.proveedor or '-'} &nbsp;&nbsp; "
+            f"<b>Registro INVIMA:</b> {informe.invima_registro or '-'} &nbsp;&nbsp; "
+            f"<b>Estado:</b> {'ACTIVO y coincidente' if informe.invima_estado_activo else 'No verificado/No activo'}"
+        )
+        if informe.invima_url.strip():
+            portada += f" &nbsp;&nbsp; <b>Consulta:</b> {informe.invima_url}"
+        story.append(Paragraph(portada, style_header))
+        story.append(Spacer(1, 4*mm))
+        story.append(Paragraph(f"<b>Cumplimiento (sobre ítems contestados):</b> {percent}%", style_header))
+        story.append(Spacer(1, 4*mm))
+
+        if informe.solo_no:
+            hay_no = any(it.estado == "no" for it in informe.items)
+            if not hay_no:
+                story.append(Paragraph(
+                    "<b>No se registran ítems en estado NO CUMPLE.</b>",
+                    style_header
+                ))
+                return _construir(doc, story, buf, destino)
+
+        # Filas de la tabla
+        data = [["Ítem", "Estado", "Observación", "Referencia"]]
+        for it in informe.items:
+            if informe.solo_no and it.estado != "no":
+                continue
+
+            estado_humano = ESTADOS_HUMANOS.get(it.estado, "Sin responder")
+            obs = it.nota or "-"
+            obs = "-" if obs.strip() == "" else _wrap(obs, 110)
+            celda_item = str(it.titulo)
+            if it.subchecks:
+                celda_item += "".join(
+                    f"<br/>• {texto}: <b>{'Sí' if ok else 'No'}</b>" for texto, ok in it.subchecks
+                )
+            data.append([
+                Paragraph(celda_item,         style_cell),
+                Paragraph(str(estado_humano), style_cell),
+                Paragraph(obs,                style_cell),
+                Paragraph(str(it.referencia), style_cell),
+            ])
+
+        tbl = r.Tabla(data, colWidths=[105*mm, 25*mm, 80*mm, 55*mm], repeatRows=1)
+        tbl.setStyle(r.estilo_tabla)
+        story.append(tbl)
+
+    with medir("pdf_fase", fase="evidencias"):
+        # Evidencias (página nueva)
+        any_ev = any(len(it.evidencias) > 0 for it in informe.items)
+        if any_ev:
+            story.append(PageBreak())
+            story.append(Paragraph("<b>Evidencia fotográfica</b>", style_header))
+            story.append(Spacer(1, 3*mm))
+            for it in informe.items:
+                if not it.evidencias:
+                    continue
+                story.append(Paragraph(f"<b>Ítem:</b> {it.titulo}", style_header))
+                story.append(Paragraph("<b>Evidencia de incumplimiento:</b>", style_header))
+                story.append(Spacer(1, 2*mm))
+                for ev in it.evidencias:
+                    story.append(r.ImagenDiferida(obtener_imagen, ev["sha"], "impresion", 85*mm, 55*mm,
+                                                  nombre=ev.get("name", "")))
+                    if ev.get("caption"):
+                        story.append(Paragraph(ev["caption"], style_cell))
+                    story.append(Spacer(1, 3*mm))
+                story.append(Spacer(1, 4*mm))
+
+        # Anexo opcional: originales en resolución completa, uno por página
+        if any_ev and informe.anexo_completo:
+            for it in informe.items:
+                for ev in it.evidencias:
+                    story.append(PageBreak())
+                    story.append(Paragraph(f"<b>Anexo — Ítem:</b> {it.titulo} — {ev.get('name', '')}", style_header))
+                    story.append(Spacer(1, 2*mm))
+                    story.append(r.ImagenDiferida(obtener_imagen, ev["sha"], "original", 270*mm, 175*mm,
+                                                  nombre=ev.get("name", "")))
+
+    return _construir(doc, story, buf, destino)
+
+
+def _construir(doc, story, buf, destino):
+    with medir("pdf_fase", fase="build"):
+        doc.build(story)
+    if destino is None:
+        buf.seek(0)
+    return buf
+
+
+def generar_pdf_spool(informe: Informe, obtener_imagen, progreso=None, max_memoria: int = MAX_PDF_EN_MEMORIA):
+    """PDF en un SpooledTemporaryFile ya rebobinado (pasa a disco al superar `max_memoria`)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memoria, mode="w+b")
+    try:
+        generar_pdf(informe, obtener_imagen, progreso=progreso, destino=spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+# ===========================================
+# VERIFICACIONES GUARDADAS (JSON + evidencias/)
+# ===========================================
+def _shas(informe: Informe):
+    vistos = set()
+    for it in informe.items:
+        for ev in it.evidencias:
+            if ev["sha"] not in vistos:
+                vistos.add(ev["sha"])
+                yield ev["sha"]
+
+
+def empaquetar_zip(informe: Informe, nombre: str, obtener_imagen, max_memoria: int = MAX_PDF_EN_MEMORIA):
+    """ZIP listo para descomprimir en el directorio de entrada del lote, en un SpooledTemporaryFile rebobinado.
+
+    Las imágenes se piden y se escriben de a una: en memoria solo queda la que se está copiando.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memoria, mode="w+b")
+    try:
+        with zipfile.ZipFile(spool, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr(f"{nombre}.json", json.dumps(informe.a_dict(), ensure_ascii=False, indent=1))
+            for sha in _shas(informe):
+                zf.writestr(f"{DIR_EVIDENCIAS}/{sha}", obtener_imagen(sha, "original"))
+                zf.writestr(f"{DIR_EVIDENCIAS}/{sha}{SUFIJO_IMPRESION}", obtener_imagen(sha, "impresion"))
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def cargar_json(ruta: str) -> Informe:
+    with open(ruta, encoding="utf-8") as fh:
+        return Informe.desde_dict(json.load(fh))
+
+
+def lector_directorio(directorio: str):
+    """`obtener_imagen` que lee de <directorio>/evidencias/."""
+    base = os.path.join(directorio, DIR_EVIDENCIAS)
+
+    def obtener_imagen(sha: str, tipo: str) -> bytes:
+        ruta = os.path.join(base, sha)
+        if tipo == "impresion" and os.path.exists(ruta + SUFIJO_IMPRESION):
+            ruta += SUFIJO_IMPRESION
+        with open(ruta, "rb") as fh:
+            return fh.read()
+
+    return obtener_imagen
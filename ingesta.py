@@ -0,0 +1,113 @@
+
+# ingesta.py
+# Ingesta concurrente de evidencias subidas, antes de que entren al estado
+# - Cada archivo se lee, se hashea, se valida y se reduce en un hilo del pool
+#   (hashlib y la decodificación/compresión de PIL liberan el GIL)
+# - Se rechazan: archivos sobre MAX_BYTES_EVIDENCIA, formatos distintos de JPEG/PNG,
+#   imágenes corruptas o truncadas y las de más de MAX_PIXELES (bombas de descompresión)
+# - Duplicados se omiten: los ya adjuntos al ítem (sin decodificarlos) y los repetidos en el lote
+# - progreso(hechos, total, resultado) se llama en el hilo que llama a ingerir(),
+#   a medida que termina cada archivo (seguro para actualizar widgets de Streamlit)
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image
+
+from evidencias import huella_contenido
+from imagenes import generar_variantes
+from metricas import medir
+
+FORMATOS_PERMITIDOS = ("JPEG", "PNG")
+MAX_BYTES_EVIDENCIA = 20 * 1024 * 1024
+MAX_PIXELES         = 60_000_000
+MAX_HILOS_INGESTA   = min(4, os.cpu_count() or 1)
+
+OK, DUPLICADO, RECHAZADO = "ok", "duplicado", "rechazado"
+
+
+class EvidenciaInvalida(ValueError):
+    pass
+
+
+@dataclass
+class ResultadoIngesta:
+    nombre: str
+    estado: str                 # OK / DUPLICADO / RECHAZADO
+    sha: str = None
+    datos: bytes = None
+    variantes: dict = None      # {"mini", "impresion"} (ver imagenes.py)
+    motivo: str = ""
+
+
+def validar_imagen(datos: bytes) -> str:
+    """Comprueba tamaño, formato y estructura de la imagen; devuelve el formato (PIL)."""
+    if len(datos) > MAX_BYTES_EVIDENCIA:
+        raise EvidenciaInvalida(f"supera el máximo de {MAX_BYTES_EVIDENCIA // (1024 * 1024)} MB")
+    if not datos:
+        raise EvidenciaInvalida("archivo vacío")
+    try:
+        with Image.open(BytesIO(datos)) as img:
+            formato = img.format
+            ancho, alto = img.size
+            img.verify()
+    except Exception as e:
+        raise EvidenciaInvalida(f"no es una imagen válida ({e})") from None
+    if formato not in FORMATOS_PERMITIDOS:
+        raise EvidenciaInvalida(f"formato {formato} no admitido (solo JPG/PNG)")
+    if ancho * alto > MAX_PIXELES:
+        raise EvidenciaInvalida(f"{ancho}×{alto} px supera el máximo de {MAX_PIXELES // 1_000_000} MP")
+    return formato
+
+
+def _procesar(nombre: str, leer, ya_adjuntos) -> ResultadoIngesta:
+    with medir("ingesta_archivo"):
+        datos = leer()
+        sha = huella_contenido(datos)
+        if sha in ya_adjuntos:
+            return ResultadoIngesta(nombre, DUPLICADO, sha=sha, motivo="ya está adjunta a este ítem")
+        try:
+            validar_imagen(datos)
+            # La decodificación completa (variantes) detecta también archivos truncados
+            variantes = generar_variantes(datos)
+        except EvidenciaInvalida as e:
+            return ResultadoIngesta(nombre, RECHAZADO, sha=sha, motivo=str(e))
+        except Exception as e:
+            return ResultadoIngesta(nombre, RECHAZADO, sha=sha, motivo=f"imagen dañada ({e})")
+        return ResultadoIngesta(nombre, OK, sha=sha, datos=datos, variantes=variantes)
+
+
+class IngestorEvidencias:
+    def __init__(self, max_hilos: int = MAX_HILOS_INGESTA):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="ingesta5109")
+
+    def ingerir(self, archivos, ya_adjuntos=(), progreso=None) -> list:
+        """Procesa [(nombre, leer)] en paralelo; `leer()` devuelve los bytes del archivo.
+
+        Devuelve un ResultadoIngesta por archivo, en el orden de entrada.
+        """
+        archivos = list(archivos)
+        ya_adjuntos = frozenset(ya_adjuntos)
+        resultados = [None] * len(archivos)
+        with medir("ingesta_lote"):
+            futuros = {self._pool.submit(_procesar, nombre, leer, ya_adjuntos): i
+                       for i, (nombre, leer) in enumerate(archivos)}
+            for hechos, fut in enumerate(as_completed(futuros), start=1):
+                i = futuros[fut]
+                try:
+                    resultados[i] = fut.result()
+                except Exception as e:
+                    resultados[i] = ResultadoIngesta(archivos[i][0], RECHAZADO, motivo=f"no se pudo leer ({e})")
+                if progreso is not None:
+                    progreso(hechos, len(archivos), resultados[i])
+        # Repetidos dentro del mismo lote: se conserva el primero
+        vistos = set()
+        for r in resultados:
+            if r.estado != OK:
+                continue
+            if r.sha in vistos:
+                r.estado, r.datos, r.variantes, r.motivo = DUPLICADO, None, None, "repetida en esta carga"
+            vistos.add(r.sha)
+        return resultados
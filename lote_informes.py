@@ -0,0 +1,214 @@
+
+# lote_informes.py
+# Generación masiva de informes PDF sin navegador
+#   python lote_informes.py ENTRADA [-o SALIDA] [-p PROCESOS] [--invima [DB]] [--solo-validar]
+#   python lote_informes.py --db [RUTA] [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [-o SALIDA] ...
+# - ENTRADA: directorio con verificaciones guardadas (*.json + evidencias/)
+#   (por ejemplo, los ZIP descargados desde la app, descomprimidos en la misma carpeta: el JSON
+#   lleva el id de la verificación, así las descargadas el mismo día no se pisan)
+# - --db: lee las verificaciones directamente de la base de la app (persistencia.py), filtradas
+#   por fecha del informe; cada una sale como SALIDA/verificacion_<id>.pdf
+# - Cada verificación se renderiza en un proceso del pool (ReportLab es CPU-bound)
+# - --invima: valida en bloque los registros sanitarios contra el registro INVIMA importado
+#   (registro_invima.py) y escribe SALIDA/validacion_invima.csv
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from functools import lru_cache
+
+from checklist import cargar_plan, planes_disponibles
+from informe import Informe, ItemInforme, cargar_json, generar_pdf, lector_directorio
+from persistencia import RUTA_DB, AlmacenVerificaciones
+from registro_invima import RUTA_DB_INVIMA, RegistroINVIMA
+
+
+def _destino_pdf(ruta_json: str, entrada: str, salida: str) -> str:
+    # Se replica la ruta relativa: dos verificaciones con el mismo nombre en carpetas
+    # distintas no se pisan en la salida
+    relativa = os.path.relpath(ruta_json, entrada)
+    return os.path.join(salida, os.path.splitext(relativa)[0] + ".pdf")
+
+
+def _renderizar(ruta_json: str, entrada: str, salida: str) -> str:
+    informe = cargar_json(ruta_json)
+    obtener_imagen = lector_directorio(os.path.dirname(ruta_json))
+    destino = _destino_pdf(ruta_json, entrada, salida)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    # Se escribe directo al archivo de salida: ni el PDF ni las imágenes quedan completos en memoria
+    with open(destino, "wb") as fh:
+        generar_pdf(informe, obtener_imagen, destino=fh)
+    return destino
+
+
+# ---------- verificaciones de la base (--db) ----------
+@lru_cache(maxsize=None)
+def _almacen(ruta_db: str) -> AlmacenVerificaciones:
+    return AlmacenVerificaciones(ruta_db)   # uno por proceso del pool
+
+
+@lru_cache(maxsize=None)
+def _planes() -> dict:
+    return {p.id: p for p in map(cargar_plan, planes_disponibles().values())}
+
+
+def _informe_guardado(db: AlmacenVerificaciones, verif_id: int) -> Informe:
+    """Informe de una verificación de la base, con el plan con que se hizo (como construir_informe en App.py)."""
+    datos = db.cargar(verif_id)
+    if datos is None:
+        raise KeyError(f"no existe la verificación #{verif_id}")
+    # Las anteriores a los planes (o de un plan retirado) usan el vigente
+    plan = _planes().get(datos["plan"]) or cargar_plan()
+    respuestas, evidencias = datos["respuestas"], datos["evidencias"]
+    items = []
+    for it in plan.items:
+        estado, nota, sub = respuestas.get(it.id) or respuestas.get(it.titulo) or ("none", "", 0)
+        items.append(ItemInforme(
+            titulo=it.titulo, referencia=it.referencia, estado=estado, nota=nota,
+            evidencias=list(evidencias.get(it.id) or evidencias.get(it.titulo) or []),
+            subchecks=[[c.texto, bool(sub >> bit & 1)] for bit, c in enumerate(it.sub.checks)]
+                      if it.sub is not None else [],
+        ))
+    return Informe(**datos["encabezado"], items=items)
+
+
+def _lector_db(db: AlmacenVerificaciones):
+    """`obtener_imagen` que lee los blobs de la base; sin variante de impresión, el original."""
+    def obtener_imagen(sha: str, tipo: str) -> bytes:
+        datos = db.blob_tipo(sha, tipo)
+        if datos is None and tipo != "original":
+            datos = db.blob_tipo(sha, "original")
+        if datos is None:
+            raise KeyError(f"evidencia {sha} no está en la base")
+        return datos
+
+    return obtener_imagen
+
+
+def _renderizar_db(ruta_db: str, verif_id: int, salida: str) -> str:
+    db = _almacen(ruta_db)
+    informe = _informe_guardado(db, verif_id)
+    destino = os.path.join(salida, f"verificacion_{verif_id}.pdf")
+    with open(destino, "wb") as fh:
+        generar_pdf(informe, _lector_db(db), destino=fh)
+    return destino
+
+
+def _fecha(texto: str) -> str:
+    try:
+        return date.fromisoformat(texto).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida {texto!r} (AAAA-MM-DD)") from None
+
+
+def _buscar_json(entrada: str):
+    for raiz, _, archivos in os.walk(entrada):
+        for a in sorted(archivos):
+            if a.endswith(".json"):
+                yield os.path.join(raiz, a)
+
+
+def _validar_invima(informes: dict, ruta_db: str, salida: str) -> int:
+    """Escribe validacion_invima.csv ({verificación: Informe}); devuelve cuántas tienen observaciones."""
+    registro = RegistroINVIMA(ruta_db)
+    if not len(registro):
+        print(f"El registro INVIMA en {ruta_db} está vacío (importe uno con registro_invima.py)", file=sys.stderr)
+    fichas = registro.validar_lote(inf.invima_registro for inf in informes.values())
+
+    observaciones = 0
+    destino = os.path.join(salida, "validacion_invima.csv")
+    with open(destino, "w", newline="", encoding="utf-8-sig") as fh:
+        w = csv.writer(fh)
+        w.writerow(["verificacion", "registro", "resultado", "declarado_activo",
+                    "producto_informe", "producto_registro", "marca", "titular", "estado", "vencimiento"])
+        for verificacion, inf in informes.items():
+            ficha = fichas.get(inf.invima_registro)
+            if not inf.invima_registro.strip():
+                resultado = "SIN REGISTRO"
+            elif ficha is None:
+                resultado = "NO ENCONTRADO"
+            elif not ficha.vigente:
+                resultado = "NO VIGENTE"
+            elif not inf.invima_estado_activo:
+                resultado = "VIGENTE (no marcado en la verificación)"
+            else:
+                resultado = "VIGENTE"
+            if resultado != "VIGENTE":
+                observaciones += 1
+            w.writerow([
+                verificacion, inf.invima_registro, resultado, "sí" if inf.invima_estado_activo else "no",
+                inf.producto, ficha.nombre if ficha else "", ficha.marca if ficha else "",
+                ficha.titular if ficha else "", ficha.estado if ficha else "", ficha.vencimiento if ficha else "",
+            ])
+    print(f"Validación INVIMA: {len(informes) - observaciones}/{len(informes)} vigentes → {destino}")
+    return observaciones
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Renderiza en paralelo verificaciones 5109 guardadas a PDF.")
+    ap.add_argument("entrada", nargs="?", help="Directorio con verificaciones guardadas (*.json + evidencias/)")
+    ap.add_argument("--db", nargs="?", const=RUTA_DB, default=None, metavar="RUTA",
+                    help=f"Leer las verificaciones de la base de la app en vez de ENTRADA (por defecto: {RUTA_DB})")
+    ap.add_argument("--desde", type=_fecha, default=None, help="Con --db: solo informes con fecha desde (AAAA-MM-DD)")
+    ap.add_argument("--hasta", type=_fecha, default=None, help="Con --db: solo informes con fecha hasta (AAAA-MM-DD)")
+    ap.add_argument("-o", "--salida", default="informes_pdf", help="Directorio de salida (por defecto: informes_pdf)")
+    ap.add_argument("-p", "--procesos", type=int, default=None, help="Procesos del pool (por defecto: núcleos de CPU)")
+    ap.add_argument("--invima", nargs="?", const=RUTA_DB_INVIMA, default=None, metavar="DB",
+                    help=f"Validar los registros INVIMA contra el registro importado (por defecto: {RUTA_DB_INVIMA})")
+    ap.add_argument("--solo-validar", action="store_true", help="Con --invima: validar sin generar los PDF")
+    args = ap.parse_args(argv)
+    if args.solo_validar and args.invima is None:
+        ap.error("--solo-validar requiere --invima")
+    if (args.entrada is None) == (args.db is None):
+        ap.error("indique ENTRADA o --db (uno de los dos)")
+    if args.db is None and (args.desde or args.hasta):
+        ap.error("--desde / --hasta requieren --db")
+
+    # (etiqueta, función del pool, argumentos) por verificación
+    if args.db is not None:
+        if not os.path.exists(args.db):
+            print(f"No existe la base {args.db}", file=sys.stderr)
+            return 1
+        trabajos = [(f"#{v}", _renderizar_db, (args.db, v, args.salida))
+                    for v in _almacen(args.db).listar(args.desde or "", args.hasta or "")]
+    else:
+        trabajos = [(os.path.relpath(r, args.entrada), _renderizar, (r, args.entrada, args.salida))
+                    for r in _buscar_json(args.entrada)]
+    if not trabajos:
+        print(f"No se encontraron verificaciones en {args.db or args.entrada}", file=sys.stderr)
+        return 1
+    os.makedirs(args.salida, exist_ok=True)
+
+    if args.invima is not None:
+        informes = {}
+        for etiqueta, _, argumentos in trabajos:
+            try:
+                informes[etiqueta] = (_informe_guardado(_almacen(args.db), argumentos[1]) if args.db is not None
+                                      else cargar_json(argumentos[0]))
+            except Exception as e:
+                print(f"ERROR {etiqueta}: {e}", file=sys.stderr)
+        _validar_invima(informes, args.invima, args.salida)
+        if args.solo_validar:
+            return 0
+
+    t0 = time.perf_counter()
+    errores = 0
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        futuros = {pool.submit(funcion, *argumentos): etiqueta for etiqueta, funcion, argumentos in trabajos}
+        for fut in as_completed(futuros):
+            try:
+                print(f"OK    {fut.result()}")
+            except Exception as e:
+                errores += 1
+                print(f"ERROR {futuros[fut]}: {e}", file=sys.stderr)
+
+    print(f"{len(trabajos) - errores}/{len(trabajos)} informes en {time.perf_counter() - t0:.1f} s")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
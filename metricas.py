@@ -0,0 +1,187 @@
+
+# metricas.py
+# Instrumentación de rutas calientes, sin dependencias (solo biblioteca estándar)
+# - REGISTRO: uno por proceso, compartido por sesiones e hilos (con lock)
+# - medir("nombre", etiqueta=valor): context manager que acumula duraciones en un
+#   histograma (conteo, suma, máximo, último valor y buckets fijos)
+# - fijar("nombre", valor, ...): gauges; con `ttl` caducan (p. ej. una por sesión)
+# - a_prometheus() / escribir_prometheus(ruta): formato de texto de Prometheus
+#   (apto para el "textfile collector" de node_exporter)
+# - tamano_aprox(obj): bytes aproximados de un objeto (para st.session_state)
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIJO = "checklist5109_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RUTA_METRICAS = os.environ.get("CHECKLIST_5109_METRICAS", "metricas_5109.prom")
+INTERVALO_ESCRITURA = 10.0   # segundos mínimos entre volcados del archivo
+
+
+class _Histograma:
+    __slots__ = ("conteo", "suma", "maximo", "ultimo", "buckets")
+
+    def __init__(self):
+        self.conteo = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.ultimo = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observar(self, valor: float):
+        self.conteo += 1
+        self.suma += valor
+        self.ultimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.buckets[i] += 1
+                break
+
+
+def _clave(nombre: str, etiquetas: dict):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas_prom(etiquetas, extra=()) -> str:
+    pares = [f'{k}="{_escapar(v)}"' for k, v in (*etiquetas, *extra)]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}   # (nombre, etiquetas) -> _Histograma (segundos)
+        self._gauges = {}        # (nombre, etiquetas) -> (valor, caduca_en o None)
+        self._ultima_escritura = 0.0
+
+    def observar(self, nombre: str, segundos: float, **etiquetas) -> None:
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = _Histograma()
+            h.observar(segundos)
+
+    @contextmanager
+    def medir(self, nombre: str, **etiquetas):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - t0, **etiquetas)
+
+    def fijar(self, nombre: str, valor: float, ttl: float = None, **etiquetas) -> None:
+        caduca = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._gauges[_clave(nombre, etiquetas)] = (valor, caduca)
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (_, caduca) in self._gauges.items() if caduca is not None and caduca < ahora]:
+            del self._gauges[clave]
+
+    # ---------- lectura ----------
+    def tabla(self) -> tuple:
+        """(histogramas, gauges) como filas para el panel de administración (tiempos en ms)."""
+        with self._lock:
+            self._purgar()
+            filas = [
+                {"métrica": n, "etiquetas": ", ".join(f"{k}={v}" for k, v in et),
+                 "n": h.conteo, "media_ms": round(h.suma / h.conteo * 1000, 2),
+                 "último_ms": round(h.ultimo * 1000, 2), "máx_ms": round(h.maximo * 1000, 2)}
+                for (n, et), h in sorted(self._histogramas.items())
+            ]
+            gauges = [
+                {"métrica": n, "etiquetas": ", ".join(f"{k}={v}" for k, v in et), "valor": valor}
+                for (n, et), (valor, _) in sorted(self._gauges.items())
+            ]
+        return filas, gauges
+
+    def a_prometheus(self) -> str:
+        lineas = []
+        with self._lock:
+            self._purgar()
+            vistos = set()
+            for (nombre, et), h in sorted(self._histogramas.items()):
+                n = f"{PREFIJO}{nombre}_seconds"
+                if n not in vistos:
+                    vistos.add(n)
+                    lineas.append(f"# TYPE {n} histogram")
+                acumulado = 0
+                for limite, cuenta in zip(BUCKETS, h.buckets):
+                    acumulado += cuenta
+                    lineas.append(f"{n}_bucket{_etiquetas_prom(et, (('le', repr(limite)),))} {acumulado}")
+                lineas.append(f"{n}_bucket{_etiquetas_prom(et, (('le', '+Inf'),))} {h.conteo}")
+                lineas.append(f"{n}_sum{_etiquetas_prom(et)} {h.suma!r}")
+                lineas.append(f"{n}_count{_etiquetas_prom(et)} {h.conteo}")
+            for (nombre, et), (valor, _) in sorted(self._gauges.items()):
+                n = f"{PREFIJO}{nombre}"
+                if n not in vistos:
+                    vistos.add(n)
+                    lineas.append(f"# TYPE {n} gauge")
+                lineas.append(f"{n}{_etiquetas_prom(et)} {valor!r}")
+        return "\n".join(lineas) + "\n"
+
+    def escribir_prometheus(self, ruta: str = RUTA_METRICAS, intervalo: float = INTERVALO_ESCRITURA) -> bool:
+        """Vuelca las métricas a `ruta` (reemplazo atómico) si pasó `intervalo` desde el último volcado."""
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_escritura < intervalo:
+                return False
+            self._ultima_escritura = ahora
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.a_prometheus())
+        os.replace(tmp, ruta)
+        return True
+
+
+REGISTRO = Registro()
+medir = REGISTRO.medir
+fijar = REGISTRO.fijar
+
+
+def tamano_aprox(obj, _vistos=None) -> int:
+    """Bytes aproximados de `obj` y lo que contiene (buffers por su longitud, sin copiarlos)."""
+    if _vistos is None:
+        _vistos = set()
+    if id(obj) in _vistos:
+        return 0
+    _vistos.add(id(obj))
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, memoryview):
+        return obj.nbytes
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return sys.getsizeof(obj)
+    if hasattr(obj, "buffer_info"):   # array.array
+        return obj.buffer_info()[1] * obj.itemsize
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamano_aprox(k, _vistos) + tamano_aprox(v, _vistos) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(tamano_aprox(v, _vistos) for v in obj)
+    slots = getattr(type(obj), "__slots__", ())
+    if slots:
+        return sys.getsizeof(obj) + sum(tamano_aprox(getattr(obj, s, None), _vistos) for s in slots)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + tamano_aprox(vars(obj), _vistos)
+    return sys.getsizeof(obj)
+
+
+def memoria_proceso() -> int:
+    """RSS pico del proceso en bytes (0 si la plataforma no lo expone)."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024
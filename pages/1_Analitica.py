@@ -0,0 +1,83 @@
+
+# pages/1_Analitica.py
+# Analítica de cumplimiento — Resolución 5109/2005
+# - Tasas de NO CUMPLE por ítem, proveedor y mes sobre las verificaciones guardadas
+# - Los agregados viven en un AnaliticaCumplimiento compartido por el proceso
+#   y se actualizan incrementalmente en cada visita (solo auditorías nuevas o editadas)
+
+import streamlit as st
+from analitica import AnaliticaCumplimiento
+from checklist import cargar_plan, planes_disponibles
+from persistencia import AlmacenVerificaciones, RUTA_DB
+
+st.set_page_config(page_title="Analítica — Resolución 5109/2005", layout="wide")
+st.title("Analítica de cumplimiento — Resolución 5109 de 2005")
+
+@st.cache_resource
+def _almacen_db():
+    return AlmacenVerificaciones(RUTA_DB)
+
+@st.cache_resource
+def _analitica():
+    return AnaliticaCumplimiento(cargar_plan().id)
+
+analitica = _analitica()
+leidas = analitica.actualizar(_almacen_db())
+
+st.caption(f"{analitica.n_verificaciones} verificaciones analizadas ({leidas} nuevas o modificadas desde la última visita).")
+if analitica.n_verificaciones == 0:
+    st.info("Aún no hay verificaciones guardadas.")
+    st.stop()
+
+# Cada ítem se nombra con el plan de su verificación
+planes = {p.id: p for p in map(cargar_plan, planes_disponibles().values())}
+varios_planes = analitica.filas["plan"].nunique() > 1
+
+def _nombre_item(clave):
+    # Los ítems se guardan por id estable; las verificaciones antiguas, por título
+    plan_id, item_id = clave
+    plan = planes.get(plan_id)
+    item = plan.por_id.get(item_id) if plan is not None else None
+    nombre = (item.titulo.strip("\u200e ") or item.id) if item is not None else item_id
+    return f"[{plan_id}] {nombre}" if varios_planes else nombre
+
+def _por_nombre(df, eje="index"):
+    # Índice/columnas (plan, ítem) → nombre legible
+    etiquetas = [_nombre_item(c) for c in getattr(df, eje)]
+    return df.set_axis(etiquetas, axis=eje)
+
+columnas = {"no": "No cumple", "contestado": "Contestados", "tasa_no": "Tasa NO CUMPLE", "tendencia": "Tendencia"}
+
+def _tabla(df):
+    st.dataframe(
+        df.assign(tasa_no=df["tasa_no"] * 100).rename(columns=columnas),
+        column_config={"Tasa NO CUMPLE": st.column_config.NumberColumn(format="%.1f %%")},
+        use_container_width=True,
+    )
+
+# ===========================================
+# POR MES (con tendencia)
+# ===========================================
+st.subheader("Tasa de NO CUMPLE por mes")
+por_mes = analitica.por_mes()
+if por_mes.empty:
+    st.write("Sin verificaciones con fecha válida (AAAA-MM-DD).")
+else:
+    st.line_chart(por_mes[["tasa_no", "tendencia"]].rename(columns=columnas))
+    por_item_mes = analitica.item_por_mes()
+    if not por_item_mes.empty:
+        st.markdown("**Por ítem**")
+        st.line_chart(_por_nombre(por_item_mes, "columns"))
+
+# ===========================================
+# POR ÍTEM
+# ===========================================
+st.subheader("Tasa de NO CUMPLE por ítem")
+_tabla(_por_nombre(analitica.por_item()))
+
+# ===========================================
+# POR PROVEEDOR
+# ===========================================
+st.subheader("Tasa de NO CUMPLE por proveedor")
+minimo = st.number_input("Mínimo de ítems contestados por proveedor", min_value=1, value=10, step=1)
+_tabla(analitica.por_proveedor(int(minimo)))
@@ -0,0 +1,256 @@
+
+# persistencia.py
+# Almacén local de verificaciones (SQLite en modo WAL)
+# - Guardado incremental: cada respuesta/evidencia se escribe como una sola fila (UPSERT)
+# - Evidencias fuera de línea: los bytes viven en `blobs` (uno por sha), las filas solo referencian
+# - Índices por producto, proveedor, registro INVIMA y fecha para reabrir auditorías al instante
+# - Pool de conexiones compartido por los hilos: Streamlit corre cada rerun y cada fragmento
+#   en un hilo nuevo, así que una conexión por hilo se abriría (con sus PRAGMA) en cada run
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+RUTA_DB = os.environ.get("CHECKLIST_5109_DB", "verificaciones_5109.db")
+
+CAMPOS_ENCABEZADO = (
+    "producto", "proveedor", "responsable", "fecha_verif",
+    "invima_registro", "invima_estado_activo", "invima_url",
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS verificaciones (
+    id                   INTEGER PRIMARY KEY,
+    producto             TEXT COLLATE NOCASE NOT NULL DEFAULT '',
+    proveedor            TEXT COLLATE NOCASE NOT NULL DEFAULT '',
+    responsable          TEXT NOT NULL DEFAULT '',
+    fecha_verif          TEXT NOT NULL DEFAULT '',
+    invima_registro      TEXT COLLATE NOCASE NOT NULL DEFAULT '',
+    invima_estado_activo INTEGER NOT NULL DEFAULT 0,
+    invima_url           TEXT NOT NULL DEFAULT '',
+    plan_id              TEXT NOT NULL DEFAULT '',   -- id del plan del checklist ('' = anterior a los planes)
+    creado               TEXT NOT NULL,
+    actualizado          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_verif_producto    ON verificaciones(producto);
+CREATE INDEX IF NOT EXISTS ix_verif_proveedor   ON verificaciones(proveedor);
+CREATE INDEX IF NOT EXISTS ix_verif_invima      ON verificaciones(invima_registro);
+CREATE INDEX IF NOT EXISTS ix_verif_fecha       ON verificaciones(fecha_verif);
+CREATE INDEX IF NOT EXISTS ix_verif_actualizado ON verificaciones(actualizado);
+
+CREATE TABLE IF NOT EXISTS respuestas (
+    verif_id INTEGER NOT NULL REFERENCES verificaciones(id) ON DELETE CASCADE,
+    item     TEXT NOT NULL,
+    estado   TEXT NOT NULL DEFAULT 'none',
+    nota     TEXT NOT NULL DEFAULT '',
+    subchecks INTEGER NOT NULL DEFAULT 0,   -- bitset del mini checklist (ver estado.py)
+    PRIMARY KEY (verif_id, item)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS evidencias (
+    verif_id INTEGER NOT NULL REFERENCES verificaciones(id) ON DELETE CASCADE,
+    item     TEXT NOT NULL,
+    orden    INTEGER NOT NULL,
+    sha      TEXT NOT NULL,
+    nombre   TEXT NOT NULL DEFAULT '',
+    caption  TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (verif_id, item, orden)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS blobs (
+    sha       TEXT PRIMARY KEY,
+    original  BLOB NOT NULL,
+    mini      BLOB,
+    impresion BLOB
+);
+"""
+
+
+MAX_CONEXIONES_LIBRES = 4
+
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class PoolConexiones:
+    """Conexiones SQLite reutilizables desde cualquier hilo (una por uso, nunca compartida a la vez)."""
+
+    def __init__(self, ruta: str, pragmas=(), max_libres: int = MAX_CONEXIONES_LIBRES):
+        self.ruta = ruta
+        self._pragmas = tuple(pragmas)
+        self._max_libres = max_libres
+        self._lock = threading.Lock()
+        self._libres = []
+
+    def _abrir(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.ruta, timeout=10, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        for pragma in self._pragmas:
+            con.execute(f"PRAGMA {pragma}")
+        return con
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión; el bloque es una transacción (commit al salir, rollback si falla)."""
+        with self._lock:
+            con = self._libres.pop() if self._libres else None
+        if con is None:
+            con = self._abrir()
+        try:
+            with con:
+                yield con
+        finally:
+            with self._lock:
+                if len(self._libres) < self._max_libres:
+                    self._libres.append(con)
+                    con = None
+            if con is not None:
+                con.close()
+
+
+class AlmacenVerificaciones:
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._pool = PoolConexiones(ruta, ("journal_mode=WAL", "synchronous=NORMAL", "foreign_keys=ON"))
+        with self._con() as con:
+            con.executescript(ESQUEMA)
+            # Bases creadas antes de guardar el mini checklist
+            columnas = {f["name"] for f in con.execute("PRAGMA table_info(respuestas)")}
+            if "subchecks" not in columnas:
+                con.execute("ALTER TABLE respuestas ADD COLUMN subchecks INTEGER NOT NULL DEFAULT 0")
+            # Bases creadas antes de poder elegir el plan del checklist
+            columnas = {f["name"] for f in con.execute("PRAGMA table_info(verificaciones)")}
+            if "plan_id" not in columnas:
+                con.execute("ALTER TABLE verificaciones ADD COLUMN plan_id TEXT NOT NULL DEFAULT ''")
+
+    def _con(self):
+        return self._pool.conexion()
+
+    def conexion(self):
+        """Conexión prestada del pool, como context manager (lecturas masivas, p. ej. pandas.read_sql_query)."""
+        return self._con()
+
+    # ---------- escritura incremental ----------
+    def crear(self, encabezado: dict, plan_id: str = "") -> int:
+        return self.importar([(encabezado, plan_id, ())])[0]
+
+    def actualizar_encabezado(self, verif_id: int, encabezado: dict) -> None:
+        asignaciones = ", ".join(f"{c} = ?" for c in CAMPOS_ENCABEZADO)
+        with self._con() as con:
+            con.execute(
+                f"UPDATE verificaciones SET {asignaciones}, actualizado = ? WHERE id = ?",
+                (*[encabezado.get(c, "") for c in CAMPOS_ENCABEZADO], _ahora(), verif_id),
+            )
+
+    def guardar_respuesta(self, verif_id: int, item: str, estado: str, nota: str, subchecks: int = 0) -> None:
+        with self._con() as con:
+            con.execute(
+                "INSERT INTO respuestas (verif_id, item, estado, nota, subchecks) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(verif_id, item) DO UPDATE SET "
+                "estado = excluded.estado, nota = excluded.nota, subchecks = excluded.subchecks",
+                (verif_id, item, estado, nota, subchecks),
+            )
+            con.execute("UPDATE verificaciones SET actualizado = ? WHERE id = ?", (_ahora(), verif_id))
+
+    def agregar_evidencia(self, verif_id: int, item: str, ref: dict, original: bytes,
+                          mini: bytes = None, impresion: bytes = None) -> None:
+        with self._con() as con:
+            con.execute(
+                "INSERT OR IGNORE INTO blobs (sha, original, mini, impresion) VALUES (?, ?, ?, ?)",
+                (ref["sha"], original, mini, impresion),
+            )
+            con.execute(
+                "INSERT INTO evidencias (verif_id, item, orden, sha, nombre, caption) "
+                "VALUES (?, ?, (SELECT COUNT(*) FROM evidencias WHERE verif_id = ? AND item = ?), ?, ?, ?)",
+                (verif_id, item, verif_id, item, ref["sha"], ref.get("name", ""), ref.get("caption", "")),
+            )
+            con.execute("UPDATE verificaciones SET actualizado = ? WHERE id = ?", (_ahora(), verif_id))
+
+    def importar(self, verificaciones) -> list:
+        """Crea en una sola transacción [(encabezado, plan_id, [(item, estado, nota, subchecks)])].
+
+        Devuelve los ids creados, en el mismo orden (importación masiva de instantáneas).
+        """
+        ahora = _ahora()
+        ids = []
+        with self._con() as con:
+            for encabezado, plan_id, filas in verificaciones:
+                cur = con.execute(
+                    f"INSERT INTO verificaciones ({', '.join(CAMPOS_ENCABEZADO)}, plan_id, creado, actualizado) "
+                    f"VALUES ({', '.join('?' * len(CAMPOS_ENCABEZADO))}, ?, ?, ?)",
+                    (*[encabezado.get(c, "") for c in CAMPOS_ENCABEZADO], plan_id, ahora, ahora),
+                )
+                con.executemany(
+                    "INSERT INTO respuestas (verif_id, item, estado, nota, subchecks) VALUES (?, ?, ?, ?, ?)",
+                    ((cur.lastrowid, *f) for f in filas),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    # ---------- lectura ----------
+    def buscar(self, texto: str = "", limite: int = 50) -> list:
+        """Coincidencia por prefijo en producto / proveedor / registro INVIMA (usa los índices NOCASE)."""
+        cols = "id, producto, proveedor, invima_registro, fecha_verif, actualizado"
+        with self._con() as con:
+            if not texto.strip():
+                filas = con.execute(
+                    f"SELECT {cols} FROM verificaciones ORDER BY actualizado DESC LIMIT ?", (limite,)
+                ).fetchall()
+            else:
+                patron = texto.strip().replace("%", "").replace("_", "") + "%"
+                filas = con.execute(
+                    f"SELECT {cols} FROM verificaciones WHERE producto LIKE ?1 "
+                    f"UNION SELECT {cols} FROM verificaciones WHERE proveedor LIKE ?1 "
+                    f"UNION SELECT {cols} FROM verificaciones WHERE invima_registro LIKE ?1 "
+                    f"ORDER BY actualizado DESC LIMIT ?2",
+                    (patron, limite),
+                ).fetchall()
+        return [dict(f) for f in filas]
+
+    def listar(self, desde: str = "", hasta: str = "") -> list:
+        """Ids de las verificaciones con fecha_verif (AAAA-MM-DD) entre `desde` y `hasta`, inclusive."""
+        with self._con() as con:
+            filas = con.execute(
+                "SELECT id FROM verificaciones WHERE fecha_verif >= ?1 AND (?2 = '' OR fecha_verif <= ?2) ORDER BY id",
+                (desde, hasta),
+            ).fetchall()
+        return [f[0] for f in filas]
+
+    def cargar(self, verif_id: int):
+        """{"encabezado", "plan", "respuestas": {item: (estado, nota, subchecks)}, "evidencias": {item: [ref]}} o None."""
+        with self._con() as con:
+            fila = con.execute("SELECT * FROM verificaciones WHERE id = ?", (verif_id,)).fetchone()
+            if fila is None:
+                return None
+            respuestas = {
+                r["item"]: (r["estado"], r["nota"], r["subchecks"])
+                for r in con.execute("SELECT item, estado, nota, subchecks FROM respuestas WHERE verif_id = ?", (verif_id,))
+            }
+            evidencias = {}
+            for r in con.execute(
+                "SELECT item, sha, nombre, caption FROM evidencias WHERE verif_id = ? ORDER BY item, orden", (verif_id,)
+            ):
+                evidencias.setdefault(r["item"], []).append({"name": r["nombre"], "sha": r["sha"], "caption": r["caption"]})
+        encabezado = {c: fila[c] for c in CAMPOS_ENCABEZADO}
+        encabezado["invima_estado_activo"] = bool(encabezado["invima_estado_activo"])
+        return {"encabezado": encabezado, "plan": fila["plan_id"], "respuestas": respuestas, "evidencias": evidencias}
+
+    def blob_tipo(self, sha: str, tipo: str):
+        """Solo la columna `tipo` ("original" / "mini" / "impresion") del sha, o None."""
+        if tipo not in ("original", "mini", "impresion"):
+            raise ValueError(f"tipo de blob desconocido: {tipo!r}")
+        with self._con() as con:
+            fila = con.execute(f"SELECT {tipo} FROM blobs WHERE sha = ?", (sha,)).fetchone()
+        return fila[0] if fila is not None else None
+
+    def uso_evidencias(self, verif_id: int):
+        """(shas, bytes) de las evidencias ya guardadas en la verificación (cuota de evidencias.py)."""
+        with self._con() as con:
+            filas = con.execute(
+                "SELECT b.sha, length(b.original) + ifnull(length(b.mini), 0) + ifnull(length(b.impresion), 0) "
+                "FROM blobs b WHERE b.sha IN (SELECT sha FROM evidencias WHERE verif_id = ?)", (verif_id,)
+            ).fetchall()
+        return {f[0] for f in filas}, sum(f[1] for f in filas)
@@ -0,0 +1,338 @@
+
+# registro_invima.py
+# Registro sanitario INVIMA fuera de línea: exportación CSV → SQLite indexado
+#   python registro_invima.py importar EXPORTACION.csv [--db RUTA]
+#   python registro_invima.py buscar TEXTO [--db RUTA]
+# - Por número de registro: clave primaria normalizada (mayúsculas, sin espacios ni guiones)
+#   y LRU en memoria, así las consultas repetidas en cada rerun son una búsqueda en un dict
+# - refrescar(): una consulta por clave primaria a `importacion`; si otro proceso (p. ej. la
+#   línea de comandos) importó mientras tanto, descarta la LRU y relee el resumen
+# - Por nombre o marca: prefijo sobre columnas normalizadas (índices NOCASE) y, si no alcanza,
+#   coincidencia aproximada con FTS5 (trigramas) ordenada con difflib
+# - Las exportaciones traen una fila por presentación: se agrupan por registro al importar
+# - validar_lote(registros): cientos de registros con pocas consultas IN (...) (lote_informes.py)
+
+import argparse
+import csv
+import difflib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+
+from persistencia import PoolConexiones
+
+RUTA_DB_INVIMA = os.environ.get("CHECKLIST_5109_INVIMA_DB", "registro_invima.db")
+
+# Encabezados aceptados por campo (se comparan normalizados: sin tildes, minúsculas, solo a-z0-9)
+COLUMNAS = {
+    "registro":       ("registrosanitario", "registro", "numeroregistro", "numerodelregistro"),
+    "nombre":         ("producto", "nombreproducto", "nombredelproducto", "nombre"),
+    "marca":          ("marca", "marcas"),
+    "titular":        ("titular", "nombretitular", "titulardelregistro", "razonsocialtitular"),
+    "estado":         ("estadoregistro", "estadodelregistro", "estado"),
+    "vencimiento":    ("fechavencimiento", "fechadevencimiento", "vencimiento"),
+    "presentaciones": ("presentacioncomercial", "presentacionescomerciales", "presentaciones",
+                       "presentacion", "descripcioncomercial"),
+}
+OBLIGATORIAS = ("registro", "nombre")
+ESTADOS_VIGENTES = {"vigente", "activo", "renovado", "en tramite de renovacion", "en tramite renovacion"}
+FORMATOS_FECHA = ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y")
+MAX_CACHE_CONSULTAS = 4096
+MAX_CANDIDATOS_APROX = 200
+UMBRAL_APROX = 0.6
+_LOTE_IN = 500   # parámetros por consulta IN (...) (SQLite admite 999 en versiones antiguas)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    registro       TEXT PRIMARY KEY,             -- normalizado (ver normalizar_registro)
+    registro_texto TEXT NOT NULL,                -- tal como viene en la exportación
+    nombre         TEXT NOT NULL DEFAULT '',
+    marca          TEXT NOT NULL DEFAULT '',
+    titular        TEXT NOT NULL DEFAULT '',
+    estado         TEXT NOT NULL DEFAULT '',
+    vencimiento    TEXT NOT NULL DEFAULT '',     -- AAAA-MM-DD o ''
+    presentaciones TEXT NOT NULL DEFAULT '[]',   -- JSON
+    nombre_norm    TEXT COLLATE NOCASE NOT NULL DEFAULT '',
+    marca_norm     TEXT COLLATE NOCASE NOT NULL DEFAULT ''
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_reg_nombre ON registros(nombre_norm);
+CREATE INDEX IF NOT EXISTS ix_reg_marca  ON registros(marca_norm);
+
+CREATE TABLE IF NOT EXISTS importacion (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+ESQUEMA_FTS = "CREATE VIRTUAL TABLE IF NOT EXISTS registros_fts USING fts5(registro UNINDEXED, texto, tokenize='trigram')"
+
+
+class RegistroInvalido(ValueError):
+    pass
+
+
+def normalizar_registro(texto: str) -> str:
+    """'rsa-0012345-2019 ' → 'RSA00123452019' (así se comparan lo digitado y lo exportado)."""
+    return re.sub(r"[^0-9A-Z]", "", (texto or "").upper())
+
+
+def normalizar_texto(texto: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_tildes.lower().split())
+
+
+def _encabezado_norm(texto: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", normalizar_texto(texto))
+
+
+def _fecha_iso(texto: str) -> str:
+    texto = (texto or "").strip()[:10]
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            pass
+    return ""
+
+
+@dataclass(frozen=True)
+class RegistroSanitario:
+    registro: str
+    nombre: str
+    marca: str
+    titular: str
+    estado: str
+    vencimiento: str
+    presentaciones: tuple
+
+    @property
+    def vigente(self) -> bool:
+        if normalizar_texto(self.estado) not in ESTADOS_VIGENTES:
+            return False
+        return not self.vencimiento or self.vencimiento >= date.today().isoformat()
+
+
+def _a_registro(fila) -> RegistroSanitario:
+    return RegistroSanitario(
+        registro=fila["registro_texto"], nombre=fila["nombre"], marca=fila["marca"],
+        titular=fila["titular"], estado=fila["estado"], vencimiento=fila["vencimiento"],
+        presentaciones=tuple(json.loads(fila["presentaciones"])),
+    )
+
+
+def _leer_csv(origen):
+    """Filas del CSV (ruta o archivo binario); detecta UTF-8/Latin-1 y separador , o ;."""
+    if hasattr(origen, "read"):
+        datos = origen.read()
+    else:
+        with open(origen, "rb") as fh:
+            datos = fh.read()
+    try:
+        texto = datos.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texto = datos.decode("latin-1")
+    primera = texto.split("\n", 1)[0]
+    separador = ";" if primera.count(";") > primera.count(",") else ","
+    return csv.reader(io.StringIO(texto, newline=""), delimiter=separador)
+
+
+class RegistroINVIMA:
+    def __init__(self, ruta: str = RUTA_DB_INVIMA):
+        self.ruta = ruta
+        self._pool = PoolConexiones(ruta, ("journal_mode=WAL", "synchronous=NORMAL"))
+        with self._con() as con:
+            con.executescript(ESQUEMA)
+            try:
+                con.execute(ESQUEMA_FTS)
+                self.con_fts = True
+            except sqlite3.OperationalError:
+                # SQLite sin FTS5 o sin el tokenizador trigram (< 3.34): solo búsqueda por prefijo
+                self.con_fts = False
+        self._consultar = lru_cache(maxsize=MAX_CACHE_CONSULTAS)(self._consultar_db)
+        self._leer_resumen()
+
+    def _con(self):
+        return self._pool.conexion()
+
+    def _leer_resumen(self):
+        with self._con() as con:
+            self.total = con.execute("SELECT COUNT(*) FROM registros").fetchone()[0]
+            meta = dict(con.execute("SELECT clave, valor FROM importacion").fetchall())
+        self.importado = meta.get("fecha", "")
+        self.origen = meta.get("origen", "")
+        self._version = meta.get("version", "")
+
+    def refrescar(self) -> None:
+        """Descarta la LRU (incluidos los no encontrados) y el resumen si hubo otra importación."""
+        with self._con() as con:
+            fila = con.execute("SELECT valor FROM importacion WHERE clave = 'version'").fetchone()
+        if (fila[0] if fila is not None else "") != self._version:
+            self._consultar.cache_clear()
+            self._leer_resumen()
+
+    def __len__(self) -> int:
+        return self.total
+
+    # ---------- importación ----------
+    def importar_csv(self, origen, nombre_origen: str = "") -> int:
+        """Reemplaza el registro con la exportación CSV; devuelve el n.º de registros distintos."""
+        filas = _leer_csv(origen)
+        try:
+            encabezado = [_encabezado_norm(c) for c in next(filas)]
+        except StopIteration:
+            raise RegistroInvalido("el CSV está vacío") from None
+        indices = {}
+        for campo, alias in COLUMNAS.items():
+            for a in alias:
+                if a in encabezado:
+                    indices[campo] = encabezado.index(a)
+                    break
+        faltan = [c for c in OBLIGATORIAS if c not in indices]
+        if faltan:
+            raise RegistroInvalido(f"al CSV le faltan las columnas: {', '.join(faltan)}")
+
+        registros = {}
+        for fila in filas:
+            valores = {c: (fila[i].strip() if i < len(fila) else "") for c, i in indices.items()}
+            clave = normalizar_registro(valores["registro"])
+            if not clave:
+                continue
+            r = registros.get(clave)
+            if r is None:
+                r = registros[clave] = dict(valores, presentaciones=[])
+            else:
+                # Filas repetidas (una por presentación): completa los campos vacíos
+                for c, v in valores.items():
+                    if c != "presentaciones" and v and not r.get(c):
+                        r[c] = v
+            p = valores.get("presentaciones", "")
+            if p and p not in r["presentaciones"]:
+                r["presentaciones"].append(p)
+        if not registros:
+            raise RegistroInvalido("el CSV no trae registros sanitarios")
+
+        with self._con() as con:
+            con.execute("DELETE FROM registros")
+            con.executemany(
+                "INSERT INTO registros (registro, registro_texto, nombre, marca, titular, estado, vencimiento, "
+                "presentaciones, nombre_norm, marca_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (clave, r["registro"], r["nombre"], r.get("marca", ""), r.get("titular", ""),
+                     r.get("estado", ""), _fecha_iso(r.get("vencimiento", "")),
+                     json.dumps(r["presentaciones"], ensure_ascii=False),
+                     normalizar_texto(r["nombre"]), normalizar_texto(r.get("marca", "")))
+                    for clave, r in registros.items()
+                ),
+            )
+            if self.con_fts:
+                con.execute("DELETE FROM registros_fts")
+                con.execute("INSERT INTO registros_fts (registro, texto) "
+                            "SELECT registro, nombre_norm || ' ' || marca_norm FROM registros")
+            con.executemany(
+                "INSERT OR REPLACE INTO importacion (clave, valor) VALUES (?, ?)",
+                (("fecha", datetime.now().isoformat(timespec="seconds")), ("origen", nombre_origen),
+                 ("version", str(time.time_ns()))),
+            )
+        self._consultar.cache_clear()
+        self._leer_resumen()
+        return len(registros)
+
+    # ---------- consultas ----------
+    def _consultar_db(self, clave: str):
+        with self._con() as con:
+            fila = con.execute("SELECT * FROM registros WHERE registro = ?", (clave,)).fetchone()
+        return _a_registro(fila) if fila is not None else None
+
+    def consultar(self, registro: str):
+        """RegistroSanitario del número dado (con o sin guiones/espacios), o None."""
+        clave = normalizar_registro(registro)
+        return self._consultar(clave) if clave else None
+
+    def validar_lote(self, registros) -> dict:
+        """{registro tal como se dio: RegistroSanitario o None}."""
+        claves = {r: normalizar_registro(r) for r in registros}
+        distintas = sorted({c for c in claves.values() if c})
+        encontrados = {}
+        with self._con() as con:
+            for i in range(0, len(distintas), _LOTE_IN):
+                parte = distintas[i:i + _LOTE_IN]
+                for fila in con.execute(
+                    f"SELECT * FROM registros WHERE registro IN ({', '.join('?' * len(parte))})", parte
+                ):
+                    encontrados[fila["registro"]] = _a_registro(fila)
+        return {r: encontrados.get(c) for r, c in claves.items()}
+
+    def buscar(self, texto: str, limite: int = 10) -> list:
+        """Registros cuyo nombre o marca empieza por `texto`; si faltan, los más parecidos."""
+        q = normalizar_texto(texto)
+        if not q:
+            return []
+        with self._con() as con:
+            patron = q.replace("%", "").replace("_", "") + "%"
+            filas = con.execute(
+                "SELECT * FROM registros WHERE nombre_norm LIKE ?1 "
+                "UNION SELECT * FROM registros WHERE marca_norm LIKE ?1 "
+                "ORDER BY nombre_norm LIMIT ?2",
+                (patron, limite),
+            ).fetchall()
+            vistos = {f["registro"] for f in filas}
+            if len(filas) < limite and self.con_fts and len(q) >= 3:
+                trigramas = {q[i:i + 3] for i in range(len(q) - 2)}
+                consulta = " OR ".join('"' + t.replace('"', '""') + '"' for t in trigramas)
+                candidatos = [
+                    c for (c,) in con.execute(
+                        "SELECT registro FROM registros_fts WHERE registros_fts MATCH ? ORDER BY rank LIMIT ?",
+                        (consulta, MAX_CANDIDATOS_APROX),
+                    )
+                    if c not in vistos
+                ]
+                aprox = []
+                for i in range(0, len(candidatos), _LOTE_IN):
+                    parte = candidatos[i:i + _LOTE_IN]
+                    for f in con.execute(
+                        f"SELECT * FROM registros WHERE registro IN ({', '.join('?' * len(parte))})", parte
+                    ):
+                        puntaje = max(difflib.SequenceMatcher(None, q, f["nombre_norm"]).ratio(),
+                                      difflib.SequenceMatcher(None, q, f["marca_norm"]).ratio())
+                        if puntaje >= UMBRAL_APROX:
+                            aprox.append((puntaje, f))
+                aprox.sort(key=lambda p: -p[0])
+                filas = list(filas) + [f for _, f in aprox[:limite - len(filas)]]
+        return [_a_registro(f) for f in filas]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Registro sanitario INVIMA fuera de línea.")
+    ap.add_argument("--db", default=RUTA_DB_INVIMA, help=f"Base del registro (por defecto: {RUTA_DB_INVIMA})")
+    sub = ap.add_subparsers(dest="orden", required=True)
+    imp = sub.add_parser("importar", help="Importa (reemplaza) desde una exportación CSV del INVIMA")
+    imp.add_argument("csv")
+    bus = sub.add_parser("buscar", help="Busca por número de registro, nombre o marca")
+    bus.add_argument("texto")
+    args = ap.parse_args(argv)
+
+    reg = RegistroINVIMA(args.db)
+    if args.orden == "importar":
+        try:
+            n = reg.importar_csv(args.csv, nombre_origen=os.path.basename(args.csv))
+        except RegistroInvalido as e:
+            print(f"ERROR {e}", file=sys.stderr)
+            return 1
+        print(f"{n} registros importados en {args.db}")
+        return 0
+
+    exacto = reg.consultar(args.texto)
+    for r in [exacto] if exacto is not None else reg.buscar(args.texto):
+        print(f"{r.registro}\t{'VIGENTE' if r.vigente else 'NO VIGENTE'}\t{r.nombre}\t{r.marca}\t{r.titular}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+
+# tareas_pdf.py
+# Generación de PDF en segundo plano, memoizada por huella del informe
+# - Un único GeneradorPDF por proceso (la app lo guarda con st.cache_resource)
+# - solicitar(): encola el build en un hilo y devuelve la Tarea (progreso / error)
+# - Los PDF terminados se guardan en una LRU acotada por bytes: un informe sin cambios
+#   se descarga al instante y solo una edición real dispara un nuevo build
+# - Cada PDF vive en un SpooledTemporaryFile: los grandes quedan en disco, no en RAM;
+#   la app lo lee con obtener() recién cuando se hace clic en "Descargar PDF"; si el informe
+#   cambió desde que se dibujó el botón, obtener() lo construye (o espera el build en curso)
+#   y lo deja en la cache, así el siguiente clic ya no vuelve a construirlo
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from informe import generar_pdf_spool, huella
+
+MAX_HILOS_PDF       = 2
+MAX_BYTES_CACHE_PDF = 256 * 1024 * 1024
+
+
+class Tarea:
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.progreso = 0.0
+        self.mensaje = "En cola"
+        self.error = None
+        self.futuro = None
+
+    @property
+    def terminada(self) -> bool:
+        return self.futuro is not None and self.futuro.done()
+
+    def _avance(self, fraccion, mensaje):
+        self.progreso = fraccion
+        self.mensaje = mensaje
+
+
+class GeneradorPDF:
+    def __init__(self, max_hilos: int = MAX_HILOS_PDF, max_bytes: int = MAX_BYTES_CACHE_PDF):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="pdf5109")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # huella -> (SpooledTemporaryFile, tamaño)
+        self._bytes = 0
+        self._max_bytes = max_bytes
+        self._tareas = {}             # huella -> Tarea en curso (o fallida)
+
+    def listo(self, clave: str) -> bool:
+        with self._lock:
+            return clave in self._cache
+
+    def resultado(self, clave: str):
+        """Bytes del PDF ya construido para esa huella, o None (nunca construido o ya desalojado).
+
+        Se lee del spool en cada llamada: quien lo pida no debería guardar el resultado.
+        """
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada is None:
+                return None
+            self._cache.move_to_end(clave)
+            spool, _ = entrada
+            spool.seek(0)
+            return spool.read()
+
+    def obtener(self, informe, obtener_imagen) -> bytes:
+        """Bytes del PDF del informe; si no está en la cache espera su build (encolándolo si hace falta).
+
+        Lanza la excepción del build si este falla.
+        """
+        clave = huella(informe)
+        datos = self.resultado(clave)
+        while datos is None:   # desalojado justo al terminar: se vuelve a pedir
+            t = self.solicitar(informe, obtener_imagen)
+            t.futuro.result()
+            if t.error is not None:
+                raise t.error
+            datos = self.resultado(clave)
+        return datos
+
+    def tarea(self, clave: str):
+        with self._lock:
+            return self._tareas.get(clave)
+
+    def solicitar(self, informe, obtener_imagen) -> Tarea:
+        """Encola el build (si no está hecho ni en curso) y devuelve su Tarea."""
+        clave = huella(informe)
+        with self._lock:
+            t = self._tareas.get(clave)
+            if t is not None and t.error is None:
+                return t
+            t = Tarea(clave)
+            self._tareas[clave] = t
+            t.futuro = self._pool.submit(self._construir, t, informe, obtener_imagen)
+            return t
+
+    def _construir(self, t: Tarea, informe, obtener_imagen):
+        try:
+            spool = generar_pdf_spool(informe, obtener_imagen, progreso=t._avance)
+        except Exception as e:
+            t.error = e
+            t.mensaje = f"Error al generar el PDF: {e}"
+            return
+        with self._lock:
+            self._guardar(t.clave, spool)
+            self._tareas.pop(t.clave, None)
+
+    def _guardar(self, clave: str, spool):
+        if clave in self._cache:
+            spool.close()
+            return
+        tam = spool.seek(0, 2)
+        self._cache[clave] = (spool, tam)
+        self._bytes += tam
+        while self._bytes > self._max_bytes and len(self._cache) > 1:
+            _, (viejo, tam_viejo) = self._cache.popitem(last=False)
+            viejo.close()
+            self._bytes -= tam_viejo